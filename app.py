@@ -1,20 +1,169 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context, has_request_context, abort, g
+from flask.json.provider import DefaultJSONProvider
 import json
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date, time, timezone
 import jwt
-from functools import wraps
+from functools import wraps, lru_cache, partial
 import re
 import uuid
+import os
+import codecs
+import csv
+import base64
+import gzip
+import hashlib
+import zlib
+import io
+import struct
+import tempfile
+import math
+import operator
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+import time as clock
+import sqlite3
+from sqlalchemy import event, select, tuple_, type_coerce, DDL, table, column, literal_column, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import load_only
+from itertools import compress, repeat
+from collections import deque, OrderedDict
+from operator import itemgetter, methodcaller
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import numpy as np
+except ImportError:  # columnar validation is only available with NumPy installed
+    np = None
+
+try:
+    import orjson
+except ImportError:  # JSON falls back to the standard json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # application/msgpack is only offered with msgpack installed
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # application/cbor is only offered with cbor2 installed
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:  # Content-Encoding: zstd is only accepted with zstandard installed
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # br responses are only offered with brotli installed
+    brotli = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Arrow / Parquet export and import need pyarrow installed
+    pa = pc = pq = None
+
+class ObservationJSONProvider(DefaultJSONProvider):
+    """JSON provider for request parsing and responses. Uses orjson when it is
+    installed and the standard json module otherwise; dates and times are
+    written in ISO format either way."""
+    @staticmethod
+    def default(o):
+        if isinstance(o, (date, time, datetime)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def orjson_options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.orjson_options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Clients asking for a binary format get it from every endpoint
+        codec = response_codec() if has_request_context() else None
+        if codec is not None:
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(codec.dumps(obj), mimetype=codec.mimetype)
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self.orjson_options(indent))
+        return self._app.response_class(body + b"\n" if indent else body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = ObservationJSONProvider(app)
 #--------------------------------------------------------------------------------
 # SQLAlchemy Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///observations.db' # path to db
-app.config['SQLALCHEMY_ECHO'] = True # echoes SQL for debug
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('OBSERVATIONS_DATABASE_URI', 'sqlite:///observations.db') # path to db
+app.config['SQLALCHEMY_ECHO'] = bool(os.environ.get('OBSERVATIONS_SQL_ECHO')) # set to echo every SQL statement while debugging
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'Team5APISecretKey'
+app.config['BULK_INSERT_CHUNK_SIZE'] = 1000 # rows per executemany insert on bulk paths
+app.config['STREAM_READ_SIZE'] = 64 * 1024 # bytes read per step when parsing streamed uploads
+app.config['STREAM_MAX_ELEMENT_SIZE'] = 16 * 1024 * 1024 # characters one element of a streamed JSON array may span
+app.config['BULK_VALIDATION_MODE'] = 'row' # 'row', 'columnar' or 'auto' (columnar for large batches)
+app.config['COLUMNAR_VALIDATION_THRESHOLD'] = 10000 # batch size at which 'auto' switches to columnar
+app.config['INGEST_SPOOL_DIR'] = os.environ.get('OBSERVATIONS_SPOOL_DIR', os.path.join(app.instance_path, 'spool')) # uploads waiting for async ingest
+app.config['INGEST_JOB_WORKERS'] = 2 # background threads applying async ingest jobs
+app.config['INGEST_JOB_MAX_ERRORS'] = 1000 # per-record errors kept on a job; the rest are only counted
+app.config['INGEST_JOB_BUSY_RETRIES'] = 5 # times a chunk is retried when SQLite reports the database locked
+# Resume unfinished ingest jobs once per process, on its first request. Turn off
+# when several processes share the database and run `flask resume-ingest-jobs` once instead.
+app.config['RESUME_INGEST_JOBS'] = True
+app.config['GROUP_COMMIT_ENABLED'] = False # gather concurrent single-record inserts into shared commits
+app.config['GROUP_COMMIT_WINDOW_MS'] = 5 # longest a record waits for others to join its commit
+app.config['GROUP_COMMIT_MAX_ROWS'] = 100 # commit early once this many records are waiting
+app.config['SQLITE_PRAGMAS'] = { # applied to every new SQLite connection
+    'journal_mode': 'WAL', # readers no longer block the writer (and vice versa)
+    'synchronous': 'NORMAL', # fsync at checkpoints only; safe with WAL (group commits run with FULL)
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024, # negative values are KiB, i.e. 64 MiB of page cache
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000, # ms to wait for a lock before 'database is locked'
+}
+app.config['SQLITE_MAINTENANCE_INTERVAL'] = 300 # seconds between WAL checkpoint / optimize runs
+app.config['SQLITE_ANALYZE_EVERY'] = 12 # run a full ANALYZE on every Nth maintenance pass
+# Run maintenance in a background thread of each serving process, started on its
+# first request; with it off, schedule `flask sqlite-maintenance` instead
+app.config['SQLITE_MAINTENANCE_THREAD'] = True
+app.config['OBSERVATIONS_PAGE_SIZE'] = 100 # default page size for observation reads
+app.config['OBSERVATIONS_MAX_PAGE_SIZE'] = 1000 # largest page a client may ask for
+app.config['STREAM_FETCH_SIZE'] = 1000 # rows fetched from the cursor per chunk of a streamed read
+app.config['ID_LOOKUP_CHUNK_SIZE'] = 500 # ids per IN (...) query, below SQLite's bound variable limit
+app.config['ID_LOOKUP_MAX_IDS'] = 10000 # most ids one multi-get request may ask for
+app.config['ARROW_BATCH_SIZE'] = 65536 # rows per Arrow record batch / Parquet row group on export and import
+app.config['MAX_DECOMPRESSED_BODY_SIZE'] = 512 * 1024 * 1024 # largest body a compressed upload may inflate to
+app.config['RESPONSE_COMPRESSION_MIN_SIZE'] = 1024 # smaller bodies are sent uncompressed (streamed ones always compress)
+app.config['RESPONSE_COMPRESSION_LEVELS'] = {'zstd': 3, 'br': 4, 'gzip': 6}
+app.config['RESPONSE_COMPRESSION_CACHE_SIZE'] = 64 * 1024 * 1024 # bytes of compressed bodies kept for repeat reads
+app.config['BACKFILL_BATCH_SIZE'] = 10000 # rows updated per transaction when filling derived columns
+app.config['GEOHASH_PRECISION'] = 9 # characters of the stored geohash cell, 9 is about 5 x 5 m
+app.config['NEARBY_DEFAULT_K'] = 50 # nearest observations returned when ?k= is not given
+app.config['NEARBY_MAX_K'] = 1000
+app.config['NEARBY_INITIAL_RADIUS_KM'] = 25 # first search radius of a k-nearest query, doubled until k are found
 #--------------------------------------------------------------------------------
 db = SQLAlchemy(app)
 ma = Marshmallow(app)
@@ -34,9 +183,49 @@ class Observation(db.Model):
     observation_precipitation = db.Column(db.Integer, nullable=False)
     observation_haze = db.Column(db.REAL, nullable=False)
     observation_becquerel = db.Column(db.Integer, nullable=False)
+    # Derived from observation_coordinates on every write and not part of the API;
+    # nullable so they can be added to an existing table and backfilled
+    observation_latitude = db.Column(db.REAL, nullable=True, info={'derived': True})
+    observation_longitude = db.Column(db.REAL, nullable=True, info={'derived': True})
+    # The observation instant in UTC, as microseconds since the Unix epoch
+    observation_timestamp = db.Column(db.BigInteger, nullable=True, info={'derived': True})
+    # Geohash cell of the position at GEOHASH_PRECISION; cells sharing a prefix are
+    # nearby, so prefix ranges of its index find neighbourhoods and sort by locality
+    observation_geohash = db.Column(db.String(12), nullable=True, info={'derived': True})
+    # Each filterable/sortable column is indexed together with the primary key,
+    # which serves both range filters and keyset pagination in that sort order
+    __table_args__ = (
+        db.Index('ix_observation_date_id', 'observation_date', 'observation_id'),
+        db.Index('ix_observation_time_id', 'observation_time', 'observation_id'),
+        db.Index('ix_observation_timezone_id', 'observation_timeZone', 'observation_id'),
+        db.Index('ix_observation_watertemp_id', 'observation_waterTemp', 'observation_id'),
+        db.Index('ix_observation_airtemp_id', 'observation_airTemp', 'observation_id'),
+        db.Index('ix_observation_humidity_id', 'observation_humidity', 'observation_id'),
+        db.Index('ix_observation_windspeed_id', 'observation_windSpeed', 'observation_id'),
+        db.Index('ix_observation_precipitation_id', 'observation_precipitation', 'observation_id'),
+        db.Index('ix_observation_haze_id', 'observation_haze', 'observation_id'),
+        db.Index('ix_observation_becquerel_id', 'observation_becquerel', 'observation_id'),
+        db.Index('ix_observation_latitude_longitude', 'observation_latitude', 'observation_longitude'),
+        db.Index('ix_observation_timestamp_id', 'observation_timestamp', 'observation_id'),
+        db.Index('ix_observation_geohash_id', 'observation_geohash', 'observation_id'),
+    )
     def __repr__(self):
         return '<Observation %r>' % self.observation_id
 #--------------------------------------------------------------------------------
+class IngestJob(db.Model):
+    """Progress of an asynchronous bulk ingest; updated in the same transaction
+    as each chunk of rows so an interrupted job resumes where it stopped"""
+    job_id = db.Column(db.String(80), primary_key=True, default=lambda: str(uuid.uuid4()))
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, done or failed
+    processed = db.Column(db.Integer, nullable=False, default=0) # records read from the spool so far
+    added = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=False, default='[]') # JSON list of per-index errors
+    message = db.Column(db.String(200), nullable=True) # reason a job failed
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    def __repr__(self):
+        return '<IngestJob %r>' % self.job_id
+#--------------------------------------------------------------------------------
 class ObservationSchema(ma.SQLAlchemyAutoSchema):
         """Definition used by serialization library based on Observation Model"""
         class Meta:
@@ -46,6 +235,16 @@ class ObservationSchema(ma.SQLAlchemyAutoSchema):
 observation_schema = ObservationSchema()
 observations_schema = ObservationSchema(many=True)
 
+# Field names a read may project with ?fields=
+OBSERVATION_FIELDS = ObservationSchema.Meta.fields
+
+@lru_cache(maxsize=128)
+def projected_schema(fields=None, many=False):
+    """Serializer limited to `fields`, built once per distinct field set"""
+    if fields is None:
+        return observations_schema if many else observation_schema
+    return ObservationSchema(only=fields, many=many)
+
 #--------------------------------------------------------------------------------
 def token_required(f):
      @wraps(f)
@@ -70,52 +269,2328 @@ def token_required(f):
 #--------------------------------------------------------------------------------
 # Helper methods for validation
 
+# Patterns are compiled once at import time and shared by every ingest path
+DATE_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})", re.ASCII)
+TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{1,2}):(\d{1,2})", re.ASCII)
+TIMEZONE_PATTERN = re.compile(r"UTC([+-])\d{2}:\d{2}", re.ASCII)
+COMPACT_DATE_PATTERN = re.compile(r"\d{4}\d{2}\d{2}", re.ASCII)
+FIXED_TIME_PATTERN = re.compile(r"\d{2}:\d{2}:\d{2}", re.ASCII)
+NUMERIC_TYPES = (int, float)
+
 def validate_date(date):
     # Validate date in the format YYYYMMDD
-    return bool(re.match(r"^\d{4}\d{2}\d{2}$", date))
+    return bool(COMPACT_DATE_PATTERN.fullmatch(date))
 
 def validate_time(time):
     # Validate time in the format hh:mm:ss
-    return bool(re.match(r"^\d{2}:\d{2}:\d{2}$", time))
+    return bool(FIXED_TIME_PATTERN.fullmatch(time))
 
 def validate_timezone_offset(offset):
     # Validate timezone offset in the format UTC+hh:mm or UTC-hh:mm
-    return bool(re.match(r"^UTC([+-])\d{2}:\d{2}$", offset))
+    return isinstance(offset, str) and bool(TIMEZONE_PATTERN.fullmatch(offset))
 
 def validate_coordinates(coord):
     try:
         lat, lon = map(float, coord.split(','))
         return -90 <= lat <= 90 and -180 <= lon <= 180
-    except ValueError:
+    except (AttributeError, ValueError):
         return False
 
 def validate_temperature(temp):
     # Validate temperature in Celsius (float)
-    return isinstance(temp, (int, float))
+    return isinstance(temp, NUMERIC_TYPES)
 
 def validate_humidity(humidity):
     # Validate humidity in g/kg (float)
-    return isinstance(humidity, (int, float))
+    return isinstance(humidity, NUMERIC_TYPES)
 
 def validate_wind_speed(wind_speed):
     # Validate wind speed in km/h (float)
-    return isinstance(wind_speed, (int, float))
+    return isinstance(wind_speed, NUMERIC_TYPES)
 
 def validate_wind_direction(direction):
     # Validate wind direction in degrees (float)
-    return isinstance(direction, (int, float))
+    return isinstance(direction, NUMERIC_TYPES)
 
 def validate_precipitation(precipitation):
     # Validate precipitation in mm (float)
-    return isinstance(precipitation, (int, float))
+    return isinstance(precipitation, NUMERIC_TYPES)
 
 def validate_haze(haze):
     # Validate haze in percentage (float)
-    return isinstance(haze, (int, float))
+    return isinstance(haze, NUMERIC_TYPES)
 
 def validate_becquerel(becquerel):
     # Validate becquerel (Bq)
-    return isinstance(becquerel, (int, float))
+    return isinstance(becquerel, NUMERIC_TYPES)
+#--------------------------------------------------------------------------------
+# Single-pass observation validator
+
+def convert_date(value):
+    # Accepts YYYY-MM-DD strings (or date objects) and returns a date
+    if isinstance(value, str):
+        match = DATE_PATTERN.fullmatch(value)
+        if match:
+            try:
+                return date(int(match[1]), int(match[2]), int(match[3]))
+            except ValueError:
+                pass
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    raise ValueError("expected a date in the format YYYY-MM-DD")
+
+def convert_time(value):
+    # Accepts hh:mm:ss strings (or time objects) and returns a time
+    if isinstance(value, str):
+        match = TIME_PATTERN.fullmatch(value)
+        if match:
+            try:
+                return time(int(match[1]), int(match[2]), int(match[3]))
+            except ValueError:
+                pass
+    elif isinstance(value, time):
+        return value
+    raise ValueError("expected a time in the format hh:mm:ss")
+
+def convert_timezone_offset(value):
+    # Accepts UTC+hh:mm or UTC-hh:mm
+    if isinstance(value, str) and TIMEZONE_PATTERN.fullmatch(value):
+        return value
+    raise ValueError("expected a timezone offset in the format UTC+hh:mm or UTC-hh:mm")
+
+def convert_coordinates(value):
+    # Accepts "lat,lon" with latitude in [-90, 90] and longitude in [-180, 180]
+    if isinstance(value, str):
+        parts = value.split(',')
+        if len(parts) == 2:
+            try:
+                lat, lon = float(parts[0]), float(parts[1])
+            except ValueError:
+                pass
+            else:
+                if -90 <= lat <= 90 and -180 <= lon <= 180:
+                    return value
+    raise ValueError("expected coordinates in the format 'lat,lon' within range")
+
+def convert_number(value):
+    # Accepts ints and floats as sent in JSON
+    if isinstance(value, NUMERIC_TYPES):
+        return value
+    raise ValueError("expected a number")
+
+def convert_string(value):
+    if isinstance(value, str):
+        return value
+    raise ValueError("expected a string")
+
+class ObservationValidationError(ValueError):
+    """Raised when a record fails validation; carries every field error"""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(describe_validation_errors(errors))
+
+def describe_validation_errors(errors):
+    """Summarises field errors with the messages the endpoints have always used"""
+    if 'observation_date' in errors or 'observation_time' in errors:
+        return "Invalid date or time format"
+    return "Invalid data format"
+
+class ObservationValidator:
+    """Checks and converts an incoming record in one pass over the model columns.
+    Converters are chosen from the column type, with a few fields overridden
+    where the API is stricter than the column (or, for wind direction, numeric
+    although stored as a string)."""
+    TYPE_CONVERTERS = {
+        db.Date: convert_date,
+        db.Time: convert_time,
+        db.REAL: convert_number,
+        db.Integer: convert_number,
+        db.String: convert_string,
+    }
+    FIELD_CONVERTERS = {
+        'observation_timeZone': convert_timezone_offset,
+        'observation_coordinates': convert_coordinates,
+        'observation_windDirection': convert_number,
+    }
+
+    def __init__(self, model):
+        self.converters = tuple(
+            (column.name, self.FIELD_CONVERTERS.get(column.name) or self.TYPE_CONVERTERS[type(column.type)])
+            for column in model.__table__.columns
+            if not column.primary_key and not column.info.get('derived')
+        )
+        self.field_names = tuple(name for name, _ in self.converters)
+
+    def validate(self, record, partial=False):
+        """Returns (row, errors): the converted column values and a dict of
+        field name -> error message. With partial=True only the fields present
+        in the record are checked, as used for updates."""
+        if not isinstance(record, dict):
+            return None, {"record": "expected a JSON object"}
+        row = {}
+        errors = {}
+        get = record.get
+        for name, convert in self.converters:
+            value = get(name)
+            if value is None:
+                if not partial:
+                    errors[name] = "missing value"
+                elif name in record:
+                    errors[name] = "value cannot be null"
+                continue
+            try:
+                row[name] = convert(value)
+            except ValueError as e:
+                errors[name] = str(e)
+        return row, errors
+
+observation_validator = ObservationValidator(Observation)
+#--------------------------------------------------------------------------------
+# Columnar validation for large bulk batches
+#
+# Records are transposed into one array per field and the common, well formed
+# case is checked with vectorised NumPy operations. Any value the fast path does
+# not accept is re-checked with the row converter, so the outcome (converted
+# values and error messages) is exactly what the row-at-a-time path produces.
+
+def fixed_width_codes(strings, width):
+    """Returns a (len(strings), width) array of code points for equal length strings"""
+    return np.array(strings, dtype=f'U{width}').view(np.uint32).reshape(len(strings), width)
+
+def is_ascii_digit(codes):
+    return (codes >= 48) & (codes <= 57)
+
+def digits_value(codes):
+    """Combines columns of ASCII digit code points into integers"""
+    value = np.zeros(codes.shape[0], dtype=np.int64)
+    for column in range(codes.shape[1]):
+        value = value * 10 + (codes[:, column].astype(np.int64) - 48)
+    return value
+
+def string_lengths(values):
+    """Length of every str value, -1 for anything else"""
+    count = len(values)
+    is_str = np.fromiter(map(isinstance, values, repeat(str)), dtype=bool, count=count)
+    lengths = np.fromiter(map(len, map(str, values)), dtype=np.int64, count=count)
+    return np.where(is_str, lengths, -1)
+
+def strings_of_length(values, width):
+    """Returns the positions of values that are str of exactly `width` characters"""
+    return np.flatnonzero(string_lengths(values) == width)
+
+def shared_objects(keys, good, build):
+    """Builds one Python object per distinct key and returns them as an object array
+    aligned with `keys`; only entries flagged in `good` are filled in"""
+    unique, inverse = np.unique(keys[good], return_inverse=True)
+    objects = np.empty(len(unique), dtype=object)
+    objects[:] = [build(key) for key in unique.tolist()]
+    result = np.empty(len(keys), dtype=object)
+    result[good] = objects[inverse]
+    return result
+
+NUMBER_TYPES = frozenset((int, float, bool))
+
+def check_number_column(values):
+    ok = np.fromiter(map(NUMBER_TYPES.__contains__, map(type, values)), dtype=bool, count=len(values))
+    return ok, None
+
+def check_date_column(values):
+    ok = np.zeros(len(values), dtype=bool)
+    converted = np.empty(len(values), dtype=object)
+    positions = strings_of_length(values, 10)
+    if len(positions):
+        codes = fixed_width_codes([values[p] for p in positions], 10)
+        well_formed = (is_ascii_digit(codes[:, [0, 1, 2, 3, 5, 6, 8, 9]]).all(axis=1) &
+                       (codes[:, 4] == 45) & (codes[:, 7] == 45))
+        year = digits_value(codes[:, 0:4])
+        month = digits_value(codes[:, 5:7])
+        day = digits_value(codes[:, 8:10])
+        # Days in month from month arithmetic on datetime64
+        months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+        month_length = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+        good = (well_formed & (year >= 1) & (month >= 1) & (month <= 12) &
+                (day >= 1) & (day <= month_length))
+        ordinal = year * 10000 + month * 100 + day
+        ok[positions] = good
+        converted[positions] = shared_objects(
+            ordinal, good, lambda key: date(key // 10000, key // 100 % 100, key % 100))
+    return ok, converted.tolist()
+
+def check_time_column(values):
+    ok = np.zeros(len(values), dtype=bool)
+    converted = np.empty(len(values), dtype=object)
+    positions = strings_of_length(values, 8)
+    if len(positions):
+        codes = fixed_width_codes([values[p] for p in positions], 8)
+        well_formed = (is_ascii_digit(codes[:, [0, 1, 3, 4, 6, 7]]).all(axis=1) &
+                       (codes[:, 2] == 58) & (codes[:, 5] == 58))
+        hour = digits_value(codes[:, 0:2])
+        minute = digits_value(codes[:, 3:5])
+        second = digits_value(codes[:, 6:8])
+        good = well_formed & (hour < 24) & (minute < 60) & (second < 60)
+        ok[positions] = good
+        converted[positions] = shared_objects(
+            hour * 3600 + minute * 60 + second, good, lambda key: time(key // 3600, key // 60 % 60, key % 60))
+    return ok, converted.tolist()
+
+def check_timezone_column(values):
+    ok = np.zeros(len(values), dtype=bool)
+    positions = strings_of_length(values, 9)
+    if len(positions):
+        codes = fixed_width_codes([values[p] for p in positions], 9)
+        ok[positions] = ((codes[:, 0] == 85) & (codes[:, 1] == 84) & (codes[:, 2] == 67) &
+                         ((codes[:, 3] == 43) | (codes[:, 3] == 45)) &
+                         is_ascii_digit(codes[:, [4, 5, 7, 8]]).all(axis=1) & (codes[:, 6] == 58))
+    return ok, None
+
+POWERS_OF_TEN = 10.0 ** np.arange(-64, 65) if np is not None else None
+
+def decimal_values(codes, part):
+    """Approximate values of the plain decimals found in `part` of each row of code
+    points. Returns (values, parsable); parsable marks an optional leading sign,
+    at least one digit and at most one dot, which float() always accepts."""
+    column = np.arange(codes.shape[1])
+    start = part.argmax(axis=1)
+    end = codes.shape[1] - part[:, ::-1].argmax(axis=1)
+    digit = is_ascii_digit(codes) & part
+    dot = (codes == 46) & part
+    sign = ((codes == 43) | (codes == 45)) & part & (column == start[:, None])
+    parsable = (((digit | dot | sign) == part).all(axis=1) &
+                (digit.sum(axis=1) >= 1) & (dot.sum(axis=1) <= 1))
+    # Each digit weighted by its power of ten relative to the dot
+    dot_at = np.where(dot.any(axis=1), dot.argmax(axis=1), end)[:, None]
+    exponent = np.where(column < dot_at, dot_at - column - 1, dot_at - column)
+    weights = POWERS_OF_TEN[np.clip(exponent, -64, 64) + 64]
+    values = (np.where(digit, codes - 48, 0) * weights).sum(axis=1)
+    negative = (sign & (codes == 45)).any(axis=1)
+    return np.where(negative, -values, values), parsable
+
+COORDINATE_MARGIN = 1e-9  # values this close to a range limit are left to float()
+
+def check_coordinates_column(values):
+    ok = np.zeros(len(values), dtype=bool)
+    lengths = string_lengths(values)
+    positions = np.flatnonzero((lengths >= 3) & (lengths <= 64))
+    if len(positions):
+        lengths = lengths[positions]
+        codes = fixed_width_codes([values[p] for p in positions], int(lengths.max()))
+        column = np.arange(codes.shape[1])
+        inside = column < lengths[:, None]
+        comma = (codes == 44) & inside
+        comma_at = comma.argmax(axis=1)[:, None]
+        lat, lat_parsable = decimal_values(codes, inside & (column < comma_at))
+        lon, lon_parsable = decimal_values(codes, inside & (column > comma_at))
+        ok[positions] = ((comma.sum(axis=1) == 1) & lat_parsable & lon_parsable &
+                         (np.abs(lat) <= 90 - COORDINATE_MARGIN) & (np.abs(lon) <= 180 - COORDINATE_MARGIN))
+    return ok, None
+
+# Vectorised checks keyed by the row converter they stand in for
+COLUMN_CHECKS = {
+    convert_number: check_number_column,
+    convert_date: check_date_column,
+    convert_time: check_time_column,
+    convert_timezone_offset: check_timezone_column,
+    convert_coordinates: check_coordinates_column,
+}
+
+def validate_records_columnar(records, validator=None, block_size=65536):
+    """Validates a batch column by column.
+    Returns (mask, rows, errors) exactly as validate_records() does, with mask
+    as a NumPy boolean array. Large batches are processed in blocks so the
+    intermediate arrays stay cache and memory friendly."""
+    validator = validator or observation_validator
+    masks = [np.zeros(0, dtype=bool)]
+    rows = []
+    errors = []
+    for start in range(0, len(records), block_size):
+        block_mask, block_rows, block_errors = validate_block_columnar(records[start:start + block_size], validator)
+        for error in block_errors:
+            error["index"] += start
+        masks.append(block_mask)
+        rows.extend(block_rows)
+        errors.extend(block_errors)
+    return np.concatenate(masks), rows, errors
+
+def validate_block_columnar(records, validator):
+    count = len(records)
+    is_record = np.fromiter(map(isinstance, records, repeat(dict)), dtype=bool, count=count)
+    record_indices = np.flatnonzero(is_record).tolist()
+    dict_records = [records[index] for index in record_indices]
+    field_errors = {}  # record index -> {field: message}
+    for index in np.flatnonzero(~is_record).tolist():
+        field_errors[index] = {"record": "expected a JSON object"}
+
+    # Transpose in a single pass when every record has all the fields;
+    # records holding exactly the model fields can later be copied as rows
+    names = validator.field_names
+    exact = np.fromiter(map(len, dict_records), dtype=np.int64, count=len(dict_records)) == len(names)
+    try:
+        columns_in = list(zip(*map(itemgetter(*names), dict_records))) or [()] * len(names)
+    except KeyError:
+        columns_in = [list(map(methodcaller('get', name), dict_records)) for name in names]
+        exact[:] = False
+
+    columns = []
+    replaced = []  # (name, column) for fields whose converted values are new objects
+    for (name, convert), values in zip(validator.converters, columns_in):
+        check = COLUMN_CHECKS.get(convert)
+        if check and values:
+            ok, converted = check(values)
+        else:
+            ok, converted = np.zeros(len(values), dtype=bool), None
+        is_replaced = converted is not None
+        converted = list(values) if converted is None else converted
+        # Slow path for everything the vectorised check did not accept
+        for position in np.flatnonzero(~ok).tolist():
+            value = values[position]
+            try:
+                if value is None:
+                    raise ValueError("missing value")
+                converted[position] = convert(value)
+                is_replaced = is_replaced or converted[position] is not value
+            except ValueError as e:
+                field_errors.setdefault(record_indices[position], {})[name] = str(e)
+        columns.append(converted)
+        if is_replaced:
+            replaced.append((name, converted))
+
+    mask = is_record.copy()
+    if field_errors:
+        mask[list(field_errors)] = False
+    # Valid records holding exactly the model fields are copied and patched with
+    # the converted values column by column; any others are built field by field
+    keep = mask[record_indices] if record_indices else np.zeros(0, dtype=bool)
+    copied = (keep & exact).tolist()
+    rows = list(map(dict.copy, compress(dict_records, copied)))
+    for name, column in replaced:
+        deque(map(dict.__setitem__, rows, repeat(name), compress(column, copied)), maxlen=0)
+    built = (keep & ~exact).tolist()
+    if any(built):
+        order = np.flatnonzero(keep).tolist()
+        by_position = dict(zip(np.flatnonzero(keep & exact).tolist(), rows))
+        for position in compress(range(len(built)), built):
+            by_position[position] = {name: column[position] for name, column in zip(names, columns)}
+        rows = [by_position[position] for position in order]
+    errors = [bulk_error(index, ObservationValidationError(field_errors[index]))
+              for index in sorted(field_errors)]
+    return mask, rows, errors
+
+#--------------------------------------------------------------------------------
+# Helper methods for set-based bulk inserts
+
+def build_observation_row(record, validator=None):
+    """Validates one incoming record and returns it as a plain column mapping.
+    Raises ObservationValidationError listing every invalid field."""
+    row, errors = (validator or observation_validator).validate(record)
+    if errors:
+        raise ObservationValidationError(errors)
+    row["observation_id"] = str(uuid.uuid4())  # Generate a unique ID
+    return row
+
+def validate_records(records, validator=None):
+    """Validates a batch one record at a time.
+    Returns (mask, rows, errors): a validity flag per record, the converted rows
+    of the valid records in order and the error entries for the invalid ones."""
+    validator = validator or observation_validator
+    mask = []
+    rows = []
+    errors = []
+    for index, record in enumerate(records):
+        row, field_errors = validator.validate(record)
+        mask.append(not field_errors)
+        if field_errors:
+            errors.append(bulk_error(index, ObservationValidationError(field_errors)))
+        else:
+            rows.append(row)
+    return mask, rows, errors
+
+def use_columnar_validation(records):
+    """Decides between row and columnar validation for a bulk batch"""
+    mode = request.args.get('validation', app.config['BULK_VALIDATION_MODE'])
+    if np is None or mode == 'row':
+        return False
+    if mode == 'columnar':
+        return True
+    return len(records) >= app.config['COLUMNAR_VALIDATION_THRESHOLD']
+
+def bulk_error(index, error, position="index"):
+    """Formats an exception raised for one record of a bulk request;
+    `position` names what index counts (record index, CSV line number)"""
+    entry = {position: index, "error": str(error)}
+    if isinstance(error, ObservationValidationError):
+        entry["fields"] = error.errors
+    return entry
+
+def insert_observation_rows(rows, chunk_size=None, connection=None):
+    """Inserts validated rows with one executemany Core insert per chunk.
+    Skips ORM object construction and identity-map bookkeeping entirely;
+    the caller owns the transaction (the session's, or `connection`'s) and commits."""
+    chunk_size = chunk_size or app.config['BULK_INSERT_CHUNK_SIZE']
+    statement = Observation.__table__.insert()
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        for row in chunk:
+            add_derived_columns(row)
+        (connection or db.session).execute(statement, chunk)
+#--------------------------------------------------------------------------------
+# Derived columns: numeric position, geohash cell and UTC timestamp
+#
+# Filled from the API fields on every write: add_derived_columns() for set-based
+# inserts, the mapper listeners below for ORM adds and updates, and the batched
+# backfills for rows written before a column existed.
+
+def coordinates_position(coordinates):
+    """Splits a validated "lat,lon" string into (latitude, longitude)"""
+    lat, lon = coordinates.split(',')
+    return float(lat), float(lon)
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_MAX_PRECISION = 12  # 60 bits, 30 per coordinate
+
+def check_geohash_precision():
+    """observation_geohash holds at most GEOHASH_MAX_PRECISION characters, and
+    geohash_encode() at most 60 bits"""
+    precision = app.config['GEOHASH_PRECISION']
+    if not (isinstance(precision, int) and 1 <= precision <= GEOHASH_MAX_PRECISION):
+        raise ValueError(f"GEOHASH_PRECISION should be between 1 and {GEOHASH_MAX_PRECISION}, not {precision!r}")
+
+check_geohash_precision()
+
+def spread_bits(value):
+    """Moves bit i of a 32-bit value to bit 2i"""
+    value = (value | value << 16) & 0x0000FFFF0000FFFF
+    value = (value | value << 8) & 0x00FF00FF00FF00FF
+    value = (value | value << 4) & 0x0F0F0F0F0F0F0F0F
+    value = (value | value << 2) & 0x3333333333333333
+    return (value | value << 1) & 0x5555555555555555
+
+def geohash_encode(lat, lon, precision):
+    """Geohash of the cell holding (lat, lon): bits bisecting longitude and
+    latitude in turn, longitude first, five to a character"""
+    bits = 5 * precision
+    # Both coordinates are quantized to the longitude's share of bits and
+    # interleaved; an odd number of bits drops the extra, last latitude bit
+    half = (bits + 1) // 2
+    cells = 1 << half
+    lon_cell = min(int((lon + 180.0) / 360.0 * cells), cells - 1)
+    lat_cell = min(int((lat + 90.0) / 180.0 * cells), cells - 1)
+    code = (spread_bits(lon_cell) << 1 | spread_bits(lat_cell)) >> (2 * half - bits)
+    return ''.join(GEOHASH_ALPHABET[(code >> shift) & 31] for shift in range(bits - 5, -1, -5))
+
+def geohash_bounds(geohash):
+    """(south, west, north, east) of a geohash cell"""
+    south, west, north, east = -90.0, -180.0, 90.0, 180.0
+    is_lon = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            upper = value >> shift & 1
+            if is_lon:
+                middle = (west + east) / 2
+                west, east = (middle, east) if upper else (west, middle)
+            else:
+                middle = (south + north) / 2
+                south, north = (middle, north) if upper else (south, middle)
+            is_lon = not is_lon
+    return south, west, north, east
+
+def geohash_neighbours(geohash):
+    """The cells of the same precision around a geohash cell. Longitudes wrap
+    across the antimeridian; a cell on a pole has no neighbours beyond it."""
+    south, west, north, east = geohash_bounds(geohash)
+    height, width = north - south, east - west
+    lat, lon = (south + north) / 2, (west + east) / 2
+    neighbours = []
+    for dlat in (1, 0, -1):
+        neighbour_lat = lat + dlat * height
+        if not -90 < neighbour_lat < 90:
+            continue
+        for dlon in (-1, 0, 1):
+            neighbour_lon = (lon + dlon * width + 180.0) % 360.0 - 180.0
+            cell = geohash_encode(neighbour_lat, neighbour_lon, len(geohash))
+            if cell != geohash and cell not in neighbours:
+                neighbours.append(cell)
+    return neighbours
+
+@lru_cache(maxsize=None)
+def utc_offset_seconds(offset):
+    # Only a handful of distinct offsets exist, so each is parsed once
+    sign = -1 if offset[3] == '-' else 1
+    return sign * (int(offset[4:6]) * 3600 + int(offset[7:9]) * 60)
+
+def utc_timestamp(observation_date, observation_time, offset):
+    """Microseconds since the Unix epoch of a local date and time at a UTC±hh:mm offset"""
+    seconds = ((observation_date.toordinal() - EPOCH_ORDINAL) * 86400 + observation_time.hour * 3600
+               + observation_time.minute * 60 + observation_time.second - utc_offset_seconds(offset))
+    return seconds * 1000000 + observation_time.microsecond
+
+def add_derived_columns(row):
+    row['observation_latitude'], row['observation_longitude'] = coordinates_position(row['observation_coordinates'])
+    row['observation_geohash'] = geohash_encode(
+        row['observation_latitude'], row['observation_longitude'], app.config['GEOHASH_PRECISION'])
+    row['observation_timestamp'] = utc_timestamp(
+        row['observation_date'], row['observation_time'], row['observation_timeZone'])
+
+def set_position_columns(target):
+    try:
+        lat, lon = coordinates_position(target.observation_coordinates)
+    except ValueError:
+        # a legacy value the API would now reject is kept, without a position
+        target.observation_latitude = target.observation_longitude = target.observation_geohash = None
+        return
+    target.observation_latitude, target.observation_longitude = lat, lon
+    target.observation_geohash = geohash_encode(lat, lon, app.config['GEOHASH_PRECISION'])
+
+def set_timestamp_column(target):
+    try:
+        target.observation_timestamp = utc_timestamp(
+            target.observation_date, target.observation_time, target.observation_timeZone)
+    except (ValueError, IndexError):
+        target.observation_timestamp = None  # a legacy offset that is not UTC±hh:mm
+
+@event.listens_for(Observation, 'before_insert')
+def set_derived_columns(mapper, connection, target):
+    set_position_columns(target)
+    set_timestamp_column(target)
+
+@event.listens_for(Observation, 'before_update')
+def update_derived_columns(mapper, connection, target):
+    """Recomputes only the derived columns whose source fields changed"""
+    attrs = db.inspect(target).attrs
+    if attrs.observation_coordinates.history.has_changes():
+        set_position_columns(target)
+    if any(attrs[name].history.has_changes() for name in ('observation_date', 'observation_time', 'observation_timeZone')):
+        set_timestamp_column(target)
+
+POSITION_BACKFILL = db.text("""
+    UPDATE observation
+    SET observation_latitude = CAST(substr(observation_coordinates, 1, instr(observation_coordinates, ',') - 1) AS REAL),
+        observation_longitude = CAST(substr(observation_coordinates, instr(observation_coordinates, ',') + 1) AS REAL)
+    WHERE rowid > :after AND rowid <= :after + :batch_size
+      AND +observation_latitude IS NULL
+""")
+
+# geohash() is registered on every SQLite connection below. Cells of another
+# precision are recomputed too, so changing GEOHASH_PRECISION takes effect on
+# the next backfill.
+GEOHASH_BACKFILL = db.text("""
+    UPDATE observation
+    SET observation_geohash = geohash(observation_latitude, observation_longitude, :precision)
+    WHERE rowid > :after AND rowid <= :after + :batch_size
+      AND observation_latitude IS NOT NULL
+      AND (observation_geohash IS NULL OR length(observation_geohash) != :precision)
+""")
+
+@event.listens_for(Engine, "connect")
+def register_sqlite_functions(dbapi_connection, connection_record):
+    """Makes geohash(lat, lon, precision) callable from SQL"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('geohash', 3, geohash_encode, deterministic=True)
+
+# Times are stored as HH:MM:SS.ffffff and offsets as UTC±hh:mm. Legacy rows with
+# a date or time strftime cannot read are skipped and keep a NULL timestamp.
+TIMESTAMP_BACKFILL = db.text("""
+    UPDATE observation
+    SET observation_timestamp =
+        (CAST(strftime('%s', observation_date || ' ' || substr(observation_time, 1, 8)) AS INTEGER)
+         - (CASE substr(observation_timeZone, 4, 1) WHEN '-' THEN -1 ELSE 1 END)
+           * (CAST(substr(observation_timeZone, 5, 2) AS INTEGER) * 3600
+              + CAST(substr(observation_timeZone, 8, 2) AS INTEGER) * 60)) * 1000000
+        + CAST(substr(observation_time, 10, 6) AS INTEGER)
+    WHERE rowid > :after AND rowid <= :after + :batch_size
+      AND +observation_timestamp IS NULL
+      AND strftime('%s', observation_date || ' ' || substr(observation_time, 1, 8)) IS NOT NULL
+""")
+
+def backfill_in_batches(statement, batch_size=None, **params):
+    """Runs a backfill UPDATE over consecutive ranges of batch_size rowids, one
+    transaction per range so writers are only held up briefly. Each rowid is
+    visited once, so rows the UPDATE skips (legacy values it cannot convert)
+    cannot keep the run going. Statements test their column as +column IS NULL
+    so SQLite walks the rowid range rather than the column's index.
+    Returns the number of rows filled."""
+    batch_size = batch_size or app.config['BACKFILL_BATCH_SIZE']
+    with db.engine.connect() as connection:
+        # rows written later get their derived columns on insert
+        last = connection.exec_driver_sql("SELECT max(rowid) FROM observation").scalar() or 0
+    filled = 0
+    for after in range(0, last, batch_size):
+        with db.engine.begin() as connection:
+            filled += connection.execute(statement, {**params, "batch_size": batch_size, "after": after}).rowcount
+    return filled
+
+def backfill_observation_positions(batch_size=None):
+    """Fills latitude / longitude of rows written before the columns existed"""
+    return backfill_in_batches(POSITION_BACKFILL, batch_size)
+
+def backfill_observation_geohashes(batch_size=None):
+    """Fills the geohash of positioned rows lacking one at GEOHASH_PRECISION"""
+    return backfill_in_batches(GEOHASH_BACKFILL, batch_size, precision=app.config['GEOHASH_PRECISION'])
+
+def backfill_observation_timestamps(batch_size=None):
+    """Fills the UTC timestamp of rows written before the column existed"""
+    return backfill_in_batches(TIMESTAMP_BACKFILL, batch_size)
+#--------------------------------------------------------------------------------
+# R*Tree spatial index over observation positions
+#
+# observation_rtree holds one point box per positioned row, keyed by the row's
+# rowid. Triggers keep it in step with every insert, update and delete, so all
+# write paths (including raw SQL and the backfills) are covered. The R*Tree
+# stores 32-bit floats rounded outwards, so lookups through it are refined
+# against the exact REAL columns.
+
+SPATIAL_INDEX_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS observation_rtree
+       USING rtree(id, min_lat, max_lat, min_lon, max_lon)""",
+    """CREATE TRIGGER IF NOT EXISTS observation_rtree_insert AFTER INSERT ON observation
+       WHEN new.observation_latitude IS NOT NULL
+       BEGIN
+           INSERT INTO observation_rtree VALUES (new.rowid, new.observation_latitude, new.observation_latitude,
+                                                 new.observation_longitude, new.observation_longitude);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS observation_rtree_update
+       AFTER UPDATE OF observation_latitude, observation_longitude ON observation
+       BEGIN
+           DELETE FROM observation_rtree WHERE id = old.rowid;
+           INSERT INTO observation_rtree SELECT new.rowid, new.observation_latitude, new.observation_latitude,
+                                                new.observation_longitude, new.observation_longitude
+           WHERE new.observation_latitude IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS observation_rtree_delete AFTER DELETE ON observation
+       BEGIN
+           DELETE FROM observation_rtree WHERE id = old.rowid;
+       END""",
+)
+SPATIAL_INDEX_DROP = (
+    "DROP TRIGGER IF EXISTS observation_rtree_insert",
+    "DROP TRIGGER IF EXISTS observation_rtree_update",
+    "DROP TRIGGER IF EXISTS observation_rtree_delete",
+    "DROP TABLE IF EXISTS observation_rtree",
+)
+
+for statement in SPATIAL_INDEX_DDL:
+    event.listen(Observation.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Observation.__table__, 'before_drop', DDL(SPATIAL_INDEX_DROP[-1]).execute_if(dialect='sqlite'))
+
+observation_rtree = table('observation_rtree', column('id'), column('min_lat'), column('max_lat'),
+                          column('min_lon'), column('max_lon'))
+
+def rebuild_spatial_index():
+    """Refills observation_rtree from the position columns (needed after a VACUUM,
+    which may renumber rowids)"""
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM observation_rtree")
+        connection.exec_driver_sql("""
+            INSERT INTO observation_rtree
+            SELECT rowid, observation_latitude, observation_latitude, observation_longitude, observation_longitude
+            FROM observation WHERE observation_latitude IS NOT NULL""")
+
+def ensure_spatial_index():
+    """Creates observation_rtree and its triggers on an existing database, filling it once"""
+    with db.engine.begin() as connection:
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'observation_rtree'").first()
+        for statement in SPATIAL_INDEX_DDL:
+            connection.exec_driver_sql(statement)
+    if not exists:
+        rebuild_spatial_index()
+
+def parse_bbox(value):
+    """Reads bbox=south,west,north,east in degrees. west > east describes a box
+    crossing the antimeridian."""
+    try:
+        south, west, north, east = (parse_finite_number(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError("bbox should be south,west,north,east")
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bbox should be south,west,north,east with south <= north, within range")
+    return south, west, north, east
+
+def bbox_conditions(south, west, north, east):
+    """Conditions selecting the rows inside a box: candidates from the R*Tree, then the exact test"""
+    columns = Observation.__table__.c
+    rtree = observation_rtree.c
+    if west <= east:
+        candidate_lon = (rtree.max_lon >= west) & (rtree.min_lon <= east)
+        exact_lon = columns.observation_longitude.between(west, east)
+    else:
+        candidate_lon = or_(rtree.max_lon >= west, rtree.min_lon <= east)
+        exact_lon = or_(columns.observation_longitude >= west, columns.observation_longitude <= east)
+    candidates = select(rtree.id).where(rtree.max_lat >= south, rtree.min_lat <= north, candidate_lon)
+    return [literal_column('observation.rowid').in_(candidates),
+            columns.observation_latitude.between(south, north), exact_lon]
+
+#--------------------------------------------------------------------------------
+# Radius and nearest-neighbour search
+#
+# Candidates come from the R*Tree through the bounding box of the search circle,
+# as bare (rowid, latitude, longitude) rows; exact great-circle distances are
+# computed for all of them at once and ranked, and only the winners are loaded
+# in full. A k-nearest search without a radius doubles the circle until it
+# holds k observations (or covers the globe), so the k found are the true nearest.
+
+EARTH_RADIUS_KM = 6371.0088  # mean Earth radius
+HALF_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM  # no two points are further apart
+
+def circle_bbox(lat, lon, radius_km):
+    """(south, west, north, east) enclosing every point within radius_km of (lat, lon);
+    west > east when the box crosses the antimeridian"""
+    angle = radius_km / EARTH_RADIUS_KM
+    south, north = lat - math.degrees(angle), lat + math.degrees(angle)
+    if south <= -90 or north >= 90 or angle >= math.pi / 2:
+        # the circle reaches a pole, so it spans every longitude
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    spread = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+    west, east = lon - spread, lon + spread
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from (lat, lon) to each point of lats / lons"""
+    if np is None:
+        return [haversine_km_point(lat, lon, other_lat, other_lon) for other_lat, other_lon in zip(lats, lons)]
+    lat1, lat2 = math.radians(lat), np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine_km_point(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+def nearest_positions(distances, radius_km, k):
+    """Positions of the (at most k) smallest distances within radius_km, nearest first"""
+    if np is None:
+        inside = [position for position, distance in enumerate(distances) if distance <= radius_km]
+        return sorted(inside, key=distances.__getitem__)[:k]
+    inside = np.flatnonzero(distances <= radius_km)
+    if len(inside) > k:
+        inside = inside[np.argpartition(distances[inside], k - 1)[:k]]
+    return inside[np.argsort(distances[inside], kind='stable')].tolist()
+
+def find_nearby(conditions, lat, lon, k, radius_km=None):
+    """Searches the observations matching `conditions` around (lat, lon). Returns
+    (rowids, distances, radius searched) of the k nearest, or with radius_km of
+    the k nearest within it, nearest first."""
+    table = Observation.__table__
+    candidates = select(literal_column('rowid'), table.c.observation_latitude,
+                        table.c.observation_longitude).select_from(table).where(*conditions)
+    search_radius = radius_km or app.config['NEARBY_INITIAL_RADIUS_KM']
+    while True:
+        search_radius = min(search_radius, HALF_CIRCUMFERENCE_KM)
+        rows = db.session.execute(candidates.where(*bbox_conditions(*circle_bbox(lat, lon, search_radius)))).all()
+        rowids, lats, lons = zip(*rows) if rows else ((), (), ())
+        distances = haversine_km(lat, lon, lats, lons)
+        positions = nearest_positions(distances, search_radius, k)
+        if radius_km is not None or len(positions) >= k or search_radius >= HALF_CIRCUMFERENCE_KM:
+            return [rowids[p] for p in positions], [float(distances[p]) for p in positions], search_radius
+        search_radius *= 2
+
+def fetch_observations_by_rowids(rowids, fields=None):
+    """Rows of observation_select(fields) for the given rowids, in that order,
+    each ending with its rowid. Rows deleted since their rowids were found are skipped."""
+    rowid = literal_column('rowid')
+    statement = observation_select(fields).add_columns(rowid).where(rowid.in_(rowids))
+    found = {row[-1]: row for row in db.session.execute(statement)}
+    return [found[value] for value in rowids if value in found]
+
+def parse_nearby(args):
+    """Reads ?lat=&lon= (required), ?k= and ?radius_km= for a nearby search"""
+    try:
+        lat, lon = parse_finite_number(args['lat']), parse_finite_number(args['lon'])
+    except (KeyError, ValueError):
+        raise ValueError("lat and lon are required numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat should be within [-90, 90] and lon within [-180, 180]")
+    try:
+        k = int(args.get('k', app.config['NEARBY_DEFAULT_K']))
+    except ValueError:
+        raise ValueError("k should be an integer")
+    if not 1 <= k <= app.config['NEARBY_MAX_K']:
+        raise ValueError(f"k should be between 1 and {app.config['NEARBY_MAX_K']}")
+    radius_km = args.get('radius_km')
+    if radius_km is not None:
+        try:
+            radius_km = parse_finite_number(radius_km)
+        except ValueError:
+            radius_km = 0
+        if radius_km <= 0:
+            raise ValueError("radius_km should be a positive number")
+    return lat, lon, k, radius_km
+
+#--------------------------------------------------------------------------------
+# Helper methods for incremental parsing of streamed uploads
+
+def iter_ndjson_lines(stream, read_size=None):
+    """Yields (index, line) for each non-blank line of an NDJSON byte stream.
+    The stream is read in fixed size blocks rather than line by line, since
+    readline() on a WSGI input stream reads a single byte at a time."""
+    read_size = read_size or app.config['STREAM_READ_SIZE']
+    pending = b''
+    index = 0
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()  # the last piece may be an incomplete line
+        for line in lines:
+            if line.strip():
+                yield index, line
+                index += 1
+    if pending.strip():
+        yield index, pending
+
+# Longest token a JSON decode error can sit in while the token is merely cut
+# off by the end of the buffer ("-Infinity"); strings report where they start
+JSON_TRUNCATED_TOKEN = 9
+
+def json_may_be_truncated(error, buffer):
+    """Whether a decode error could go away once more of the stream is read"""
+    return error.msg.startswith('Unterminated string') or len(buffer) - error.pos <= JSON_TRUNCATED_TOKEN
+
+def iter_json_array(stream, read_size=None, max_element_size=None):
+    """Yields (index, record) for each element of a JSON array read from a byte
+    stream, decoding one element at a time so the array is never held in memory.
+    Raises ValueError if the stream is not a well formed JSON array, or an
+    element spans more than max_element_size characters."""
+    read_size = read_size or app.config['STREAM_READ_SIZE']
+    max_element_size = max_element_size or app.config['STREAM_MAX_ELEMENT_SIZE']
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    state = {"buffer": '', "position": 0, "eof": False}
+
+    def fill(size=read_size):
+        # Drop consumed text and append the next chunk of the stream
+        chunk = stream.read(size)
+        state["eof"] = not chunk
+        state["buffer"] = state["buffer"][state["position"]:] + text_decoder.decode(chunk, final=state["eof"])
+        state["position"] = 0
+
+    def next_token():
+        # Skips whitespace and returns the next character ('' at end of stream)
+        while True:
+            buffer, position = state["buffer"], state["position"]
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            state["position"] = position
+            if position < len(buffer):
+                return buffer[position]
+            if state["eof"]:
+                return ''
+            fill()
+
+    if next_token() != '[':
+        raise ValueError("Input should be a list of observations")
+    state["position"] += 1
+    if next_token() == ']':
+        return
+
+    index = 0
+    while True:
+        next_token()
+        try:
+            record, end = decoder.raw_decode(state["buffer"], state["position"])
+        except json.JSONDecodeError as e:
+            # Only an error at the end of the buffer can be an element cut short
+            if state["eof"] or not json_may_be_truncated(e, state["buffer"]):
+                raise ValueError(f"Invalid JSON at element {index}")
+            end = None
+        # A value not followed by a delimiter yet (e.g. a number) may be truncated
+        if end is None or (not state["eof"] and state["buffer"][end:end + 1] not in (' ', '\t', '\r', '\n', ',', ']')):
+            if state["eof"]:
+                raise ValueError(f"Invalid JSON at element {index}")
+            pending = len(state["buffer"]) - state["position"]
+            if pending > max_element_size:
+                raise ValueError(f"Element {index} is larger than {max_element_size} characters")
+            # Reading at least as much again as is pending keeps re-decoding a
+            # large element linear overall
+            fill(max(read_size, pending))
+            continue
+
+        yield index, record
+        index += 1
+
+        # Expect either a separator or the end of the array
+        state["position"] = end
+        token = next_token()
+        if token == ']':
+            return
+        if token != ',':
+            raise ValueError(f"Invalid JSON after element {index - 1}")
+        state["position"] += 1
+
+#--------------------------------------------------------------------------------
+# SQLite tuning and maintenance
+
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Applies the SQLITE_PRAGMAS profile to each new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+def run_sqlite_maintenance(analyze=False):
+    """Checkpoints and truncates the WAL and refreshes planner statistics.
+    Returns the wal_checkpoint result (busy, log frames, checkpointed frames)."""
+    with db.engine.connect() as connection:
+        if connection.dialect.name != 'sqlite':
+            return None
+        checkpoint = connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        connection.exec_driver_sql("ANALYZE" if analyze else "PRAGMA optimize")
+        connection.commit()
+        return tuple(checkpoint)
+
+def start_sqlite_maintenance():
+    """Starts a daemon thread running run_sqlite_maintenance() every SQLITE_MAINTENANCE_INTERVAL seconds"""
+    def loop():
+        passes = 0
+        while True:
+            clock.sleep(app.config['SQLITE_MAINTENANCE_INTERVAL'])
+            passes += 1
+            with app.app_context():
+                try:
+                    run_sqlite_maintenance(analyze=passes % app.config['SQLITE_ANALYZE_EVERY'] == 0)
+                except Exception as e:
+                    app.logger.warning("SQLite maintenance failed: %s", e)
+    thread = threading.Thread(target=loop, name='sqlite-maintenance', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command("sqlite-maintenance")
+def sqlite_maintenance_command():
+    """Checkpoint the WAL and run ANALYZE once."""
+    print(run_sqlite_maintenance(analyze=True))
+
+#--------------------------------------------------------------------------------
+# Asynchronous ingest jobs
+
+ingest_executor = None
+ingest_executor_lock = threading.Lock()
+ingest_write_lock = threading.Lock() # job workers write their chunks one at a time
+
+def query_flag(name):
+    """True when a query parameter is set to a truthy value such as ?name=true"""
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def spool_path(job_id):
+    return os.path.join(app.config['INGEST_SPOOL_DIR'], f"{job_id}.json")
+
+def submit_ingest_job_async(job_id):
+    """Hands a job to the background worker pool, creating the pool on first use"""
+    global ingest_executor
+    with ingest_executor_lock:
+        if ingest_executor is None:
+            ingest_executor = ThreadPoolExecutor(max_workers=app.config['INGEST_JOB_WORKERS'],
+                                                 thread_name_prefix='ingest')
+    return ingest_executor.submit(run_ingest_job, job_id)
+
+def run_ingest_job(job_id):
+    """Applies a spooled upload in chunks, skipping records a previous run already committed"""
+    with app.app_context():
+        job = db.session.get(IngestJob, job_id)
+        if job is None or job.status in ('done', 'failed'):
+            return
+        job.status = 'running'
+        db.session.commit()
+
+        chunk_size = app.config['BULK_INSERT_CHUNK_SIZE']
+        resume_from = job.processed
+        # Errors are kept in memory and only stored while under the cap, so a
+        # bad upload does not rewrite a growing list on every chunk
+        stored_errors = json.loads(job.errors)
+
+        def apply_chunk(start, records):
+            _, rows, errors = validate_records(records)
+            for error in errors:
+                error["index"] += start
+            for row in rows:
+                row["observation_id"] = str(uuid.uuid4())
+            room = app.config['INGEST_JOB_MAX_ERRORS'] - len(stored_errors)
+            kept = stored_errors + errors[:max(room, 0)]
+            retries = app.config['INGEST_JOB_BUSY_RETRIES']
+            for attempt in range(retries + 1):
+                try:
+                    with ingest_write_lock:
+                        insert_observation_rows(rows)
+                        job.processed = start + len(records)
+                        job.added += len(rows)
+                        if len(kept) > len(stored_errors):
+                            job.errors = json.dumps(kept)
+                        db.session.commit()  # rows and progress become durable together
+                    break
+                except OperationalError as e:
+                    # another writer (a request, the other worker) held the
+                    # database past busy_timeout: nothing of this chunk was
+                    # committed, so it is simply applied again
+                    db.session.rollback()
+                    if attempt == retries or not sqlite_busy(e):
+                        raise
+                    clock.sleep(0.05 * 2 ** attempt)
+            stored_errors[:] = kept
+
+        try:
+            with open(spool_path(job_id), 'rb') as spool:
+                chunk = []
+                chunk_start = resume_from
+                for index, record in iter_json_array(spool):
+                    if index < resume_from:
+                        continue
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        apply_chunk(chunk_start, chunk)
+                        chunk_start += len(chunk)
+                        chunk = []
+                if chunk:
+                    apply_chunk(chunk_start, chunk)
+            job.status = 'done'
+            db.session.commit()
+            os.remove(spool_path(job_id))
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(IngestJob, job_id)
+            job.status = 'failed'
+            job.message = str(e)[:200]
+            db.session.commit()
+            # The spool is kept: chunks up to job.processed are already
+            # committed, so a retry resumes after them instead of the client
+            # uploading (and inserting) them again
+
+def sqlite_busy(error):
+    """Whether an OperationalError is SQLite giving up on a lock (SQLITE_BUSY/SQLITE_LOCKED)"""
+    code = getattr(error.orig, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error.orig) or 'busy' in str(error.orig)
+
+def resume_ingest_jobs():
+    """Resubmits jobs left queued or running by a previous process"""
+    with app.app_context():
+        unfinished = IngestJob.query.filter(IngestJob.status.in_(('queued', 'running'))).all()
+        return [submit_ingest_job_async(job.job_id) for job in unfinished]
+
+startup_tasks_done = False
+startup_tasks_lock = threading.Lock()
+
+@app.before_request
+def run_startup_tasks():
+    """Runs once per serving process, whatever server or reloader started it"""
+    global startup_tasks_done
+    if startup_tasks_done or app.testing:
+        return
+    # before the flag is set, so a misconfigured process fails every request
+    check_geohash_precision()
+    with startup_tasks_lock:
+        if startup_tasks_done:
+            return
+        startup_tasks_done = True
+    if app.config['RESUME_INGEST_JOBS']:
+        resume_ingest_jobs()
+    if app.config['SQLITE_MAINTENANCE_THREAD']:
+        start_sqlite_maintenance()
+
+@app.cli.command("resume-ingest-jobs")
+def resume_ingest_jobs_command():
+    """Apply ingest jobs left queued or running, and wait for them."""
+    for future in resume_ingest_jobs():
+        future.result()
+
+#--------------------------------------------------------------------------------
+# Group commit for single-record inserts
+
+class Histogram:
+    """Thread-safe counts of observed values in fixed upper-bound buckets"""
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        position = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        with self.lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {"count": self.count, "sum": self.total, "buckets": buckets}
+
+class GroupCommitBuffer:
+    """Collects rows from concurrent requests and inserts them in one transaction.
+    A background thread commits once the oldest waiting row is GROUP_COMMIT_WINDOW_MS
+    old or GROUP_COMMIT_MAX_ROWS rows are waiting; each caller is released only
+    after the shared commit has finished."""
+    def __init__(self):
+        self.pending = []  # (row, future, submitted_at)
+        self.condition = threading.Condition()
+        self.thread = None
+        self.batch_sizes = Histogram((1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+        self.wait_ms = Histogram((0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000))
+
+    def submit(self, row):
+        """Queues a validated row and blocks until it is committed (or raises)"""
+        future = Future()
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='group-commit', daemon=True)
+                self.thread.start()
+            self.pending.append((row, future, clock.perf_counter()))
+            self.condition.notify()
+        return future.result()
+
+    def take_batch(self):
+        # Waits for the first row, then for the window to close or the batch to fill
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            deadline = self.pending[0][2] + app.config['GROUP_COMMIT_WINDOW_MS'] / 1000
+            max_rows = app.config['GROUP_COMMIT_MAX_ROWS']
+            while len(self.pending) < max_rows:
+                remaining = deadline - clock.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch, self.pending = self.pending[:max_rows], self.pending[max_rows:]
+            return batch
+
+    def run(self):
+        with app.app_context():
+            while True:
+                batch = self.take_batch()
+                try:
+                    self.commit([row for row, _, _ in batch])
+                except Exception as e:
+                    for _, future, _ in batch:
+                        future.set_exception(e)
+                    continue
+                committed_at = clock.perf_counter()
+                self.batch_sizes.observe(len(batch))
+                for _, future, submitted_at in batch:
+                    self.wait_ms.observe((committed_at - submitted_at) * 1000)
+                    future.set_result(None)
+
+    def commit(self, rows):
+        """Inserts and commits one batch with synchronous=FULL. Callers are told
+        their row is committed, so the commit must survive a power loss, which
+        the NORMAL profile only guarantees once the WAL is checkpointed."""
+        with db.engine.connect() as connection:
+            sqlite = connection.dialect.name == 'sqlite'
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA synchronous = FULL")
+                connection.commit()
+            try:
+                insert_observation_rows(rows, connection=connection)
+                connection.commit()
+            finally:
+                if sqlite:
+                    # back to the profile before the connection returns to the pool
+                    connection.rollback()
+                    synchronous = app.config['SQLITE_PRAGMAS'].get('synchronous', 'FULL')
+                    connection.exec_driver_sql(f"PRAGMA synchronous = {synchronous}")
+                    connection.commit()
+
+    def metrics(self):
+        return {"batch_size": self.batch_sizes.snapshot(), "wait_ms": self.wait_ms.snapshot()}
+
+group_commit_buffer = GroupCommitBuffer()
+
+#--------------------------------------------------------------------------------
+# Compressed request bodies (Content-Encoding: gzip / zstd)
+#
+# A compressed body is swapped for a stream that inflates it as the endpoint
+# reads, so every write path (JSON, bulk, streamed, binary, Arrow, CSV) accepts
+# it unchanged and never holds the whole inflated body unless it did before.
+
+REQUEST_DECODERS = {
+    'gzip': lambda source: gzip.GzipFile(fileobj=source, mode='rb'),
+    'x-gzip': lambda source: gzip.GzipFile(fileobj=source, mode='rb'),
+}
+if zstandard is not None:
+    REQUEST_DECODERS['zstd'] = lambda source: zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True)
+
+DECODE_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+class DecompressedBodyTooLarge(RequestEntityTooLarge):
+    description = "The decompressed request body exceeds the maximum allowed size."
+
+class ByteCounter:
+    """Passes reads through to `stream`, counting the bytes read"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.count += len(data)
+        return data
+
+class DecompressingStream(io.RawIOBase):
+    """Inflates a compressed request body as it is read. Refuses to produce more
+    than `limit` bytes, so a small upload cannot expand without bound."""
+    def __init__(self, stream, encoding, limit):
+        self.source = ByteCounter(stream)
+        self.decoder = REQUEST_DECODERS[encoding](self.source)
+        self.encoding = encoding
+        self.limit = limit
+        self.size = 0
+        self.outcome = "ok"
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            data = self.decoder.read(len(buffer))
+        except HTTPException:
+            raise
+        except DECODE_ERRORS as e:
+            self.finish("invalid")
+            raise BadRequest(f"Invalid {self.encoding} request body: {e}")
+        self.size += len(data)
+        if self.size > self.limit:
+            self.finish("too_large")
+            raise DecompressedBodyTooLarge()
+        if not data:
+            self.finish()
+        buffer[:len(data)] = data
+        return len(data)
+
+    def finish(self, outcome=None):
+        """Records the request in the compression metrics, once"""
+        if not self.finished:
+            self.finished = True
+            self.outcome = outcome or self.outcome
+            request_compression_metrics.observe(self)
+
+class CompressionMetrics:
+    """Totals and inflation ratios of compressed request bodies, per encoding"""
+    def __init__(self):
+        self.encodings = {}
+        self.ratio = Histogram((1, 2, 5, 10, 20, 50, 100, 1000))
+        self.lock = threading.Lock()
+
+    def observe(self, stream):
+        with self.lock:
+            totals = self.encodings.setdefault(stream.encoding, {
+                "requests": 0, "invalid": 0, "too_large": 0, "compressed_bytes": 0, "decompressed_bytes": 0})
+            totals["requests"] += 1
+            totals["compressed_bytes"] += stream.source.count
+            totals["decompressed_bytes"] += stream.size
+            if stream.outcome != "ok":
+                totals[stream.outcome] += 1
+        if stream.outcome == "ok" and stream.source.count:
+            self.ratio.observe(stream.size / stream.source.count)
+
+    def metrics(self):
+        with self.lock:
+            encodings = {encoding: {**totals, "ratio": totals["decompressed_bytes"] / totals["compressed_bytes"]
+                                    if totals["compressed_bytes"] else None}
+                         for encoding, totals in self.encodings.items()}
+        return {"encodings": encodings, "ratio": self.ratio.snapshot()}
+
+request_compression_metrics = CompressionMetrics()
+
+@app.before_request
+def decompress_request_body():
+    """Swaps a compressed request body for a stream inflating it on the fly"""
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if encoding in ('', 'identity'):
+        return None
+    if encoding not in REQUEST_DECODERS:
+        accepted = ', '.join(REQUEST_DECODERS)
+        return {"message": f"Content-Encoding should be one of {accepted}"}, 415, {"Accept-Encoding": accepted}
+
+    environ = request.environ
+    stream = DecompressingStream(get_input_stream(environ, max_content_length=request.max_content_length),
+                                 encoding, app.config['MAX_DECOMPRESSED_BODY_SIZE'])
+    # The inflated length is unknown, so the body is read until the decoder ends it
+    environ['wsgi.input'] = stream
+    environ['wsgi.input_terminated'] = True
+    environ.pop('CONTENT_LENGTH', None)
+    environ.pop('HTTP_CONTENT_ENCODING', None)
+    g.decompressing_stream = stream
+    return None
+
+@app.after_request
+def record_request_compression(response):
+    # Bodies are recorded when read to the end; this covers ones left partly unread
+    stream = g.pop('decompressing_stream', None)
+    if stream is not None:
+        response.call_on_close(stream.finish)
+    return response
+
+#--------------------------------------------------------------------------------
+# Filtering and sorting observation reads
+
+def parse_finite_number(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError("expected a finite number")
+    return number
+
+UTC_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def parse_instant(value):
+    """Reads an ISO 8601 date-time as a UTC timestamp (see utc_timestamp);
+    one without an offset is taken to be UTC"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("expected a date-time such as 2024-12-10T12:00:00+02:00")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - UTC_EPOCH) // timedelta(microseconds=1)
+
+def parse_geohash(value):
+    """Reads a geohash prefix, at most GEOHASH_PRECISION characters long"""
+    value = value.lower()
+    if not 0 < len(value) <= app.config['GEOHASH_PRECISION'] or value.strip(GEOHASH_ALPHABET):
+        raise ValueError(f"expected a geohash of 1 to {app.config['GEOHASH_PRECISION']} characters")
+    return value
+
+def geohash_prefix(column, prefix):
+    # '{' sorts right after 'z', the last geohash character, so this is an index range
+    return (column >= prefix) & (column < prefix + '{')
+
+def geohash_area(column, geohash):
+    """The cell and the cells around it (see geohash_neighbours)"""
+    return or_(*(geohash_prefix(column, cell) for cell in [geohash] + geohash_neighbours(geohash)))
+
+def build_observation_filters():
+    """Maps each filter query parameter to (column, comparison, converter)"""
+    columns = Observation.__table__.c
+    filters = {
+        'date_from': (columns.observation_date, operator.ge, convert_date),
+        'date_to': (columns.observation_date, operator.le, convert_date),
+        'time_from': (columns.observation_time, operator.ge, convert_time),
+        'time_to': (columns.observation_time, operator.le, convert_time),
+        'observation_timeZone': (columns.observation_timeZone, operator.eq, convert_timezone_offset),
+        # Instants across time zones, compared on the UTC timestamp
+        'observed_from': (columns.observation_timestamp, operator.ge, parse_instant),
+        'observed_to': (columns.observation_timestamp, operator.le, parse_instant),
+        # Positions inside a geohash cell, or inside it and its neighbours
+        'geohash': (columns.observation_geohash, geohash_prefix, parse_geohash),
+        'geohash_near': (columns.observation_geohash, geohash_area, parse_geohash),
+    }
+    # Numeric range filters for every metric stored as a number
+    for column in columns:
+        if isinstance(column.type, (db.REAL, db.Integer)) and not column.info.get('derived'):
+            filters[f'{column.name}_min'] = (column, operator.ge, parse_finite_number)
+            filters[f'{column.name}_max'] = (column, operator.le, parse_finite_number)
+    return filters
+
+OBSERVATION_FILTERS = build_observation_filters()
+
+# Columns reads may be sorted by; each has a (column, observation_id) index
+SORTABLE_COLUMNS = tuple(
+    column.name for column in Observation.__table__.c
+    if column.primary_key or any(
+        [key.name for key in index.columns] == [column.name, 'observation_id']
+        for index in Observation.__table__.indexes))
+
+def parse_observation_filters(args):
+    """Translates filter query parameters into SQL conditions on the observation table"""
+    conditions = []
+    for param, (column, compare, convert) in OBSERVATION_FILTERS.items():
+        value = args.get(param)
+        if value is None:
+            continue
+        try:
+            conditions.append(compare(column, convert(value)))
+        except ValueError:
+            raise ValueError(f"Invalid value for {param}")
+    if args.get('bbox') is not None:
+        conditions += bbox_conditions(*parse_bbox(args['bbox']))
+    return conditions
+
+def parse_sort(args):
+    """Reads ?sort=column or ?sort=-column (descending) and returns (column name, descending)"""
+    spec = args.get('sort', 'observation_id')
+    name = spec.lstrip('-')
+    if name not in SORTABLE_COLUMNS:
+        raise ValueError(f"sort should be one of {', '.join(SORTABLE_COLUMNS)}")
+    return name, spec.startswith('-')
+
+def sort_spec(sort):
+    name, descending = sort
+    return ('-' if descending else '') + name
+
+def sort_keys(name):
+    """Columns forming the keyset for a sort; the primary key breaks ties"""
+    if name == 'observation_id':
+        return [Observation.__table__.c.observation_id]
+    return [Observation.__table__.c[name], Observation.__table__.c.observation_id]
+
+def sort_order(name, descending):
+    return [key.desc() if descending else key.asc() for key in sort_keys(name)]
+
+def json_value(value):
+    """Cursor representation of a sort key value"""
+    return value.isoformat() if isinstance(value, (date, time)) else value
+
+def cursor_value(column, value):
+    """Converts a sort key value read from a cursor back to the column's type"""
+    if isinstance(column.type, db.Date):
+        return date.fromisoformat(value)
+    if isinstance(column.type, db.Time):
+        return time.fromisoformat(value)
+    return value
+
+def parse_fields(args):
+    """Reads ?fields=a,b,c and returns the requested fields in schema order,
+    or None when every field is wanted"""
+    value = args.get('fields')
+    if value is None:
+        return None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = sorted(requested.difference(OBSERVATION_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if not requested:
+        raise ValueError("fields should name at least one field")
+    # Canonical order keeps the serializer cache to one entry per field set
+    return tuple(name for name in OBSERVATION_FIELDS if name in requested)
+
+def projection(fields, *extra):
+    """Query options loading only the projected columns (plus any the query itself needs)"""
+    if fields is None:
+        return []
+    return [load_only(*(getattr(Observation, name) for name in dict.fromkeys(fields + extra)))]
+
+def fetch_observations_by_ids(observation_ids, fields=None, chunk_size=None, codec=None):
+    """Returns (serialized observations in the order asked for, ids not found).
+    Ids are looked up with one IN (...) query per chunk so long lists stay
+    under SQLite's bound variable limit."""
+    chunk_size = chunk_size or app.config['ID_LOOKUP_CHUNK_SIZE']
+    wanted = list(dict.fromkeys(observation_ids))
+    statement = observation_select(fields, 'observation_id')
+    found = {}
+    for start in range(0, len(wanted), chunk_size):
+        chunk = wanted[start:start + chunk_size]
+        found.update((row.observation_id, row) for row in
+                     db.session.execute(statement.where(Observation.observation_id.in_(chunk))))
+    rows = [found[observation_id] for observation_id in wanted if observation_id in found]
+    missing = [observation_id for observation_id in wanted if observation_id not in found]
+    return row_encoder(fields, codec)(rows), missing
+
+def ensure_observation_columns():
+    """Adds any column declared on the model that an existing observation table lacks"""
+    table = Observation.__table__
+    with db.engine.begin() as connection:
+        # inspected on the connection that alters, so its schema cache is current
+        existing = {column['name'] for column in db.inspect(connection).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+
+def ensure_observation_indexes():
+    """Creates any index declared on the model that an existing database lacks"""
+    for index in Observation.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+#--------------------------------------------------------------------------------
+# Fast read path: Core rows serialized without ORM instances or marshmallow
+
+def raw_column(column):
+    """Selects Date/Time columns as their stored text, skipping SQLAlchemy's
+    per-value parsing; row_encoder formats them directly"""
+    if isinstance(column.type, (db.Date, db.Time)):
+        return type_coerce(column, db.String).label(column.name)
+    return column
+
+def observation_select(fields=None, *extra):
+    """Core SELECT of the projected fields, followed by any `extra` columns the caller needs"""
+    table = Observation.__table__
+    names = dict.fromkeys((fields or OBSERVATION_FIELDS) + extra)
+    return select(*(raw_column(table.c[name]) for name in names))
+
+def iso_time(stored):
+    # SQLite stores times as HH:MM:SS.ffffff, isoformat() leaves off zero microseconds
+    return stored[:8] if stored.endswith('.000000') else stored
+
+@lru_cache(maxsize=128)
+def row_encoder(fields=None, codec=None):
+    """Generates a function turning rows from observation_select(fields) into
+    the same dicts projected_schema(fields, many=True).dump() returns, or for a
+    binary `codec` into dicts holding its compact date and time values"""
+    table = Observation.__table__
+    items = []
+    for position, name in enumerate(fields or OBSERVATION_FIELDS):
+        column = table.c[name]
+        value = f"row[{position}]"
+        # The schema's inferred fields pass values through as loaded and write
+        # dates and times in ISO format. Dates are already stored that way.
+        if codec is not None and isinstance(column.type, db.Date):
+            expression = f"codec.stored_date({value})"
+        elif codec is not None and isinstance(column.type, db.Time):
+            expression = f"codec.stored_time({value})"
+        elif isinstance(column.type, db.Time):
+            expression = f"iso_time({value})"
+        else:
+            expression = value
+        if expression != value and column.nullable:
+            expression = f"(None if {value} is None else {expression})"
+        items.append((name, expression))
+    # Keys in sorted order, as jsonify writes them
+    body = ", ".join(f"{name!r}: {expression}" for name, expression in sorted(items))
+    namespace = {"iso_time": iso_time, "codec": codec}
+    exec(f"def encode(rows):\n    return [{{{body}}} for row in rows]", namespace)
+    return namespace["encode"]
+
+def parse_columnar(args, fields=None):
+    """Reads ?format=rows|columnar and ?dictionary=a,b. Returns None for the
+    default row format, otherwise the fields to dictionary encode"""
+    output_format = args.get('format', 'rows')
+    if output_format not in ('rows', 'columnar'):
+        raise ValueError("format should be rows or columnar")
+    dictionary = [name.strip() for name in args.get('dictionary', '').split(',') if name.strip()]
+    if output_format == 'rows':
+        if dictionary:
+            raise ValueError("dictionary is only supported with format=columnar")
+        return None
+    unknown = sorted(set(dictionary).difference(fields or OBSERVATION_FIELDS))
+    if unknown:
+        raise ValueError(f"Cannot dictionary encode fields that are not returned: {', '.join(unknown)}")
+    return frozenset(dictionary)
+
+def dictionary_encode(values):
+    """Replaces repeated values by indices into a list of the distinct values"""
+    positions = {}
+    indices = [positions.setdefault(value, len(positions)) for value in values]
+    return {"dictionary": list(positions), "indices": indices}
+
+@lru_cache(maxsize=128)
+def columnar_encoder(fields=None, codec=None):
+    """Returns a function turning rows from observation_select(fields) into
+    {"columns": [...], "data": {column: [values...]}}. Rows are transposed as
+    tuples; no per-row dicts are built. Values match row_encoder's."""
+    table = Observation.__table__
+    names = fields or OBSERVATION_FIELDS
+    converters = []
+    for name in names:
+        column = table.c[name]
+        if codec is not None and isinstance(column.type, db.Date):
+            convert = codec.stored_date
+        elif codec is not None and isinstance(column.type, db.Time):
+            convert = codec.stored_time
+        elif isinstance(column.type, db.Time):
+            convert = iso_time
+        else:
+            convert = None
+        if convert is not None and column.nullable:
+            convert = partial(lambda convert, value: None if value is None else convert(value), convert)
+        converters.append(convert)
+
+    def encode(rows, dictionary=frozenset()):
+        # extra columns selected after the fields (sort keys) are dropped by zip
+        columns = zip(*rows) if rows else repeat((), len(names))
+        data = {}
+        for name, convert, values in zip(names, converters, columns):
+            values = list(values) if convert is None else list(map(convert, values))
+            data[name] = dictionary_encode(values) if name in dictionary else values
+        return {"columns": list(names), "data": data}
+    return encode
+
+def encode_json(value):
+    """Compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), sort_keys=True).encode()
+
+#--------------------------------------------------------------------------------
+# Binary formats (MessagePack, CBOR) chosen by Content-Type / Accept
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MSGPACK_DATE_EXT = 1 # int32 days since 1970-01-01
+MSGPACK_TIME_EXT = 2 # uint32 seconds since midnight, or uint64 microseconds when not whole seconds
+CBOR_DATE_TAG = 100 # RFC 8943 days since 1970-01-01
+CBOR_TIME_TAG = 65100 # seconds since midnight, a float when not whole seconds
+
+def seconds_of_day(value):
+    return (value.hour * 60 + value.minute) * 60 + value.second
+
+def time_from_microseconds(microseconds):
+    seconds, microsecond = divmod(microseconds, 1000000)
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60, microsecond)
+
+def msgpack_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return msgpack.ExtType(MSGPACK_DATE_EXT, struct.pack('>i', value.toordinal() - EPOCH_ORDINAL))
+    if isinstance(value, time):
+        if value.microsecond:
+            return msgpack.ExtType(MSGPACK_TIME_EXT, struct.pack('>Q', seconds_of_day(value) * 1000000 + value.microsecond))
+        return msgpack.ExtType(MSGPACK_TIME_EXT, struct.pack('>I', seconds_of_day(value)))
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+def msgpack_ext_hook(code, data):
+    if code == MSGPACK_DATE_EXT and len(data) == 4:
+        return date.fromordinal(struct.unpack('>i', data)[0] + EPOCH_ORDINAL)
+    if code == MSGPACK_TIME_EXT and len(data) == 4:
+        return time_from_microseconds(struct.unpack('>I', data)[0] * 1000000)
+    if code == MSGPACK_TIME_EXT and len(data) == 8:
+        return time_from_microseconds(struct.unpack('>Q', data)[0])
+    return msgpack.ExtType(code, data)
+
+def cbor_date(value):
+    return cbor2.CBORTag(CBOR_DATE_TAG, value.toordinal() - EPOCH_ORDINAL)
+
+def cbor_time(value):
+    seconds = seconds_of_day(value)
+    return cbor2.CBORTag(CBOR_TIME_TAG, seconds + value.microsecond / 1e6 if value.microsecond else seconds)
+
+def cbor_encode_date(encoder, value):
+    encoder.encode(cbor_date(value))
+
+def cbor_encode_time(encoder, value):
+    encoder.encode(cbor_time(value))
+
+def cbor_tag_hook(tag, immutable):
+    if tag.tag == CBOR_TIME_TAG and isinstance(tag.value, (int, float)):
+        return time_from_microseconds(round(tag.value * 1000000))
+    return tag
+
+class CountingReader:
+    """Buffers a request stream and counts the bytes handed out, so a decoder
+    reading records from it can tell a clean end from a truncated record"""
+    def __init__(self, stream, read_size):
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer = b''
+        self.count = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self.buffer = self.buffer + self.stream.read(), b''
+        else:
+            if len(self.buffer) < size:
+                self.buffer += self.stream.read(max(size - len(self.buffer), self.read_size))
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.count += len(data)
+        return data
+
+    def peek(self, size):
+        """The next `size` bytes (fewer at end of stream) without consuming them"""
+        while len(self.buffer) < size:
+            chunk = self.stream.read(max(size - len(self.buffer), self.read_size))
+            if not chunk:
+                break
+            self.buffer += chunk
+        return self.buffer[:size]
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+def iter_msgpack_sequence(stream, read_size=None):
+    """Yields (index, record) for each value of a stream of concatenated MessagePack values"""
+    read_size = read_size or app.config['STREAM_READ_SIZE']
+    reader = CountingReader(stream, read_size)
+    unpacker = msgpack.Unpacker(reader, read_size=read_size, ext_hook=msgpack_ext_hook,
+                                raw=False, strict_map_key=False)
+    try:
+        for index, record in enumerate(unpacker):
+            yield index, record
+    except (msgpack.UnpackException, ValueError) as e:
+        raise ValueError(f"Invalid MessagePack: {e}")
+    if unpacker.tell() != reader.count:
+        raise ValueError("Truncated MessagePack value at end of stream")
+
+def iter_msgpack_array(stream, read_size=None):
+    """Yields (index, record) for each element of a MessagePack array, unpacking
+    one element at a time so the array is never held in memory"""
+    read_size = read_size or app.config['STREAM_READ_SIZE']
+    unpacker = msgpack.Unpacker(stream, read_size=read_size, ext_hook=msgpack_ext_hook,
+                                raw=False, strict_map_key=False)
+    try:
+        length = unpacker.read_array_header()
+    except (msgpack.UnpackException, ValueError):
+        raise ValueError("Input should be a list of observations")
+
+    def unpack(index):
+        try:
+            return unpacker.unpack()
+        except msgpack.OutOfData:
+            raise ValueError(f"Truncated MessagePack at element {index}")
+        except (msgpack.UnpackException, ValueError) as e:
+            raise ValueError(f"Invalid MessagePack at element {index}: {e}")
+
+    for index in range(length):
+        yield index, unpack(index)
+    try:
+        unpacker.unpack()
+    except msgpack.OutOfData:
+        return
+    except (msgpack.UnpackException, ValueError):
+        pass
+    raise ValueError("Unexpected data after the MessagePack array")
+
+def iter_cbor_array(stream, read_size=None):
+    """Yields (index, record) for each item of a CBOR array (definite or
+    indefinite length), decoding one item at a time"""
+    reader = CountingReader(stream, read_size or app.config['STREAM_READ_SIZE'])
+    head = reader.read(1)
+    if not head or head[0] >> 5 != 4:
+        raise ValueError("Input should be a list of observations")
+    info = head[0] & 0x1f
+    if info < 24:
+        length = info
+    elif info in (24, 25, 26, 27):
+        size = 1 << (info - 24)
+        argument = reader.read(size)
+        if len(argument) != size:
+            raise ValueError("Truncated CBOR array header")
+        length = int.from_bytes(argument, 'big')
+    elif info == 31:
+        length = None  # items up to a break byte
+    else:
+        raise ValueError("Invalid CBOR array header")
+    decoder = cbor2.CBORDecoder(reader, tag_hook=cbor_tag_hook)
+    index = 0
+    while length is None or index < length:
+        if length is None:
+            marker = reader.peek(1)
+            if marker == b'\xff':
+                reader.read(1)
+                break
+            if not marker:
+                raise ValueError(f"Truncated CBOR at element {index}")
+        try:
+            record = decoder.decode()
+        except cbor2.CBORDecodeEOF:
+            raise ValueError(f"Truncated CBOR at element {index}")
+        except cbor2.CBORDecodeError as e:
+            raise ValueError(f"Invalid CBOR: {e}")
+        yield index, record
+        index += 1
+    if reader.peek(1):
+        raise ValueError("Unexpected data after the CBOR array")
+
+def iter_cbor_sequence(stream, read_size=None):
+    """Yields (index, record) for each item of a CBOR sequence (RFC 8742)"""
+    reader = CountingReader(stream, read_size or app.config['STREAM_READ_SIZE'])
+    decoder = cbor2.CBORDecoder(reader, tag_hook=cbor_tag_hook)
+    index = 0
+    while True:
+        start = reader.count
+        try:
+            record = decoder.decode()
+        except cbor2.CBORDecodeEOF:
+            if reader.count == start:
+                return
+            raise ValueError("Truncated CBOR item at end of stream")
+        except cbor2.CBORDecodeError as e:
+            raise ValueError(f"Invalid CBOR: {e}")
+        yield index, record
+        index += 1
+
+class BinaryCodec:
+    """A binary body format: whole documents for ordinary requests and
+    responses, sequences of records for streamed ones"""
+    def __init__(self, mimetype, sequence_mimetype, dumps, loads, packer, iter_sequence, iter_array,
+                 encode_date, encode_time):
+        self.mimetype = mimetype
+        self.sequence_mimetype = sequence_mimetype
+        self.dumps = dumps
+        self.loads = loads
+        self.packer = packer # returns a function packing one value, reused across a stream
+        self.iter_sequence = iter_sequence
+        self.iter_array = iter_array # elements of one top-level array, decoded incrementally
+        # Stored date / time text to a value the packer writes without a callback;
+        # observations share few distinct dates and times, so these are cached
+        self.stored_date = lru_cache(maxsize=65536)(lambda text: encode_date(date.fromisoformat(text)))
+        self.stored_time = lru_cache(maxsize=65536)(lambda text: encode_time(time.fromisoformat(text)))
+
+BINARY_CODECS = {}
+if msgpack is not None:
+    BINARY_CODECS['application/msgpack'] = BinaryCodec(
+        'application/msgpack', 'application/msgpack',
+        partial(msgpack.packb, default=msgpack_default),
+        partial(msgpack.unpackb, ext_hook=msgpack_ext_hook, raw=False, strict_map_key=False),
+        lambda: msgpack.Packer(default=msgpack_default).pack,
+        iter_msgpack_sequence, iter_msgpack_array, msgpack_default, msgpack_default)
+    BINARY_CODECS['application/x-msgpack'] = BINARY_CODECS['application/msgpack']
+if cbor2 is not None:
+    CBOR_ENCODERS = {date: cbor_encode_date, time: cbor_encode_time}
+    BINARY_CODECS['application/cbor'] = BinaryCodec(
+        'application/cbor', 'application/cbor-seq',
+        partial(cbor2.dumps, encoders=CBOR_ENCODERS),
+        partial(cbor2.loads, tag_hook=cbor_tag_hook),
+        lambda: partial(cbor2.dumps, encoders=CBOR_ENCODERS),
+        iter_cbor_sequence, iter_cbor_array, cbor_date, cbor_time)
+    BINARY_CODECS['application/cbor-seq'] = BINARY_CODECS['application/cbor']
+
+def response_codec():
+    """Binary codec the client asked for with Accept, or None for JSON (the default)"""
+    offered = ['application/json'] + list(BINARY_CODECS)
+    best = request.accept_mimetypes.best_match(offered, default='application/json')
+    return BINARY_CODECS.get(best)
+
+def request_codec():
+    """Binary codec matching the request Content-Type, or None for JSON"""
+    return BINARY_CODECS.get(request.mimetype)
+
+def request_data(silent=False):
+    """Parses the request body as JSON, MessagePack or CBOR according to its Content-Type"""
+    codec = request_codec()
+    if codec is None:
+        return request.get_json(silent=silent)
+    try:
+        return codec.loads(request.get_data())
+    except Exception:
+        if silent:
+            return None
+        abort(400, description=f"Failed to decode {codec.mimetype} body")
+
+def dump_observations(observations, fields=None, many=True):
+    """Serializes observations (ORM instances or row mappings) for the negotiated
+    format. Binary formats keep dates and times native so they pack compactly."""
+    if response_codec() is None:
+        return projected_schema(fields, many=many).dump(observations)
+    names = fields or OBSERVATION_FIELDS
+
+    def native(observation):
+        if observation is None:
+            return {}
+        get = observation.get if isinstance(observation, dict) else partial(getattr, observation)
+        return {name: get(name) for name in names}
+    return list(map(native, observations)) if many else native(observation=observations)
+
+#--------------------------------------------------------------------------------
+# Compressed responses (Accept-Encoding: zstd / br / gzip)
+#
+# Buffered bodies are compressed whole and the result is cached by a digest of
+# the body, so a repeated read of unchanged data is not compressed again.
+# Streamed bodies are compressed chunk by chunk, flushing after each one so the
+# client still receives rows as they are read.
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv',
+                          'application/vnd.apache.arrow.stream'} | set(BINARY_CODECS)
+
+def gzip_compressor(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush)
+
+def brotli_compressor(level):
+    compressor = brotli.Compressor(quality=level)
+    return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+
+def zstd_compressor(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush)
+
+# Each entry returns (compress one chunk and flush it, finish the stream); listed in server preference order
+RESPONSE_ENCODERS = {}
+if zstandard is not None:
+    RESPONSE_ENCODERS['zstd'] = zstd_compressor
+if brotli is not None:
+    RESPONSE_ENCODERS['br'] = brotli_compressor
+RESPONSE_ENCODERS['gzip'] = gzip_compressor
+
+def compress_body(body, encoding, level):
+    compress, finish = RESPONSE_ENCODERS[encoding](level)
+    return compress(body) + finish()
+
+def compress_chunks(chunks, encoding, level):
+    """Compresses a streamed body incrementally, one output piece per input chunk"""
+    compress, finish = RESPONSE_ENCODERS[encoding](level)
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (encoding, level, body digest), bounded in bytes"""
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def compress(self, body, encoding, level):
+        key = (encoding, level, hashlib.blake2b(body, digest_size=16).digest())
+        with self.lock:
+            compressed = self.entries.get(key)
+            if compressed is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+        compressed = compress_body(body, encoding, level)
+        limit = app.config['RESPONSE_COMPRESSION_CACHE_SIZE']
+        if len(compressed) <= limit:
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = compressed
+                    self.size += len(compressed)
+                while self.size > limit:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return compressed
+
+    def metrics(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+compressed_body_cache = CompressedBodyCache()
+
+@app.after_request
+def compress_response(response):
+    """Compresses the response with the best encoding the client accepts"""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough:
+        return response
+    response.vary.add('Accept-Encoding')
+    if not 200 <= response.status_code < 300 or response.status_code == 204 or 'Content-Encoding' in response.headers:
+        return response
+    encoding = request.accept_encodings.best_match(list(RESPONSE_ENCODERS))
+    if encoding is None:
+        return response
+    level = app.config['RESPONSE_COMPRESSION_LEVELS'][encoding]
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < app.config['RESPONSE_COMPRESSION_MIN_SIZE']:
+            return response
+        response.set_data(compressed_body_cache.compress(body, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+#--------------------------------------------------------------------------------
+# Arrow IPC / Parquet export and import
+
+ARROW_MEDIA_TYPES = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def arrow_type(column):
+    """Arrow type storing values of an Observation column"""
+    if isinstance(column.type, db.Date):
+        return pa.date32()
+    if isinstance(column.type, db.Time):
+        return pa.time64('us')
+    if isinstance(column.type, db.REAL):
+        return pa.float64()
+    if isinstance(column.type, db.Integer):
+        return pa.int64()
+    return pa.string()
+
+def observation_arrow_schema(fields=None):
+    table = Observation.__table__
+    return pa.schema([pa.field(name, arrow_type(table.c[name]), nullable=table.c[name].nullable)
+                      for name in fields or OBSERVATION_FIELDS])
+
+def arrow_time_from_text(values):
+    """time64 array from stored HH:MM:SS[.ffffff] text, parsed column-wise"""
+    text = pa.array(values, pa.string())
+    part = lambda start, stop: pc.cast(pc.utf8_slice_codeunits(text, start, stop), pa.int64())
+    seconds = pc.add(pc.multiply(pc.add(pc.multiply(part(0, 2), 60), part(3, 5)), 60), part(6, 8))
+    fraction = pc.cast(pc.utf8_rpad(pc.utf8_slice_codeunits(text, 9, 15), 6, '0'), pa.int64())
+    return pc.add(pc.multiply(seconds, 1000000), fraction).cast(pa.time64('us'))
+
+def arrow_array(values, field):
+    """Arrow array for a column of values from observation_select(), where dates
+    and times are still the stored text"""
+    if field.type == pa.date32():
+        return pa.array(values, pa.string()).cast(pa.date32())
+    if field.type == pa.time64('us'):
+        return arrow_time_from_text(values)
+    return pa.array(values, type=field.type)
+
+def parse_arrow_format(value):
+    """Maps ?format= or a Content-Type to 'arrow' or 'parquet'"""
+    for file_format, mimetype in ARROW_MEDIA_TYPES.items():
+        if value in (file_format, mimetype):
+            return file_format
+    raise ValueError(f"format should be one of {', '.join(ARROW_MEDIA_TYPES)}")
+
+class ChunkSink:
+    """Write-only file object collecting what an Arrow / Parquet writer
+    produces, so it can be handed to the client batch by batch"""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+def stream_observations_arrow(statement, schema, file_format):
+    """Yields an Arrow IPC stream or a Parquet file of the rows selected by
+    `statement` (an observation_select()), one record batch (row group) per
+    ARROW_BATCH_SIZE rows"""
+    sink = ChunkSink()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    result = db.session.execute(statement, execution_options={"yield_per": app.config['ARROW_BATCH_SIZE']})
+    for partition in result.partitions():
+        arrays = [arrow_array(values, field) for field, values in zip(schema, zip(*partition))]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def iter_arrow_batches(stream, file_format):
+    """Yields the record batches of an uploaded Arrow IPC stream or Parquet file.
+    IPC streams are read as they arrive; Parquet keeps its index at the end
+    of the file, so it is spooled first."""
+    if file_format == 'arrow':
+        yield from pa.ipc.open_stream(stream)
+        return
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as spool:
+        shutil.copyfileobj(stream, spool, app.config['STREAM_READ_SIZE'])
+        spool.seek(0)
+        yield from pq.ParquetFile(spool).iter_batches(batch_size=app.config['ARROW_BATCH_SIZE'])
+
+def convert_numeric_string(value):
+    # Accepts a finite number written as a string, the way wind direction is stored
+    if isinstance(value, str):
+        try:
+            if math.isfinite(float(value)):
+                return value
+        except ValueError:
+            pass
+    raise ValueError("expected a number")
+
+class StoredObservationValidator(ObservationValidator):
+    """Validator for typed uploads carrying values as the columns store them,
+    such as Arrow / Parquet imports where wind direction is a string"""
+    FIELD_CONVERTERS = {**ObservationValidator.FIELD_CONVERTERS,
+                        'observation_windDirection': convert_numeric_string}
+
+stored_observation_validator = StoredObservationValidator(Observation)
+
+def arrow_batch_records(batch, schema):
+    """Casts the Observation columns of an incoming batch to their schema types
+    and returns them as records. Raises ValueError for a missing column or one
+    that cannot be cast."""
+    names = [field.name for field in schema if field.name in batch.schema.names]
+    missing = [field.name for field in schema if field.name not in names and field.name != 'observation_id']
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    try:
+        columns = [batch.column(name).cast(schema.field(name).type).to_pylist() for name in names]
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Column types do not match the observation schema: {e}")
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+#--------------------------------------------------------------------------------
+# CSV upload and export
+
+CSV_MEDIA_TYPES = ('text/csv', 'application/csv')
+
+# CSV headers are matched to columns ignoring case, with or without the observation_ prefix
+CSV_HEADER_NAMES = {key: name for name in OBSERVATION_FIELDS
+                    for key in (name.lower(), name.lower().removeprefix('observation_'))}
+
+# A JSON number: CSV values validate exactly as they would when sent as JSON,
+# so no underscores, surrounding spaces, non-ASCII digits, nan or inf
+NUMBER_TEXT_PATTERN = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?")
+
+def convert_number_text(value):
+    # Accepts an integer or a finite decimal number written as text
+    if isinstance(value, str):
+        match = NUMBER_TEXT_PATTERN.fullmatch(value)
+        if match:
+            if not match.group(1) and not match.group(2):
+                return int(value)
+            number = float(value)
+            if math.isfinite(number):
+                return number
+    raise ValueError("expected a number")
+
+class TextObservationValidator(StoredObservationValidator):
+    """Validator for uploads where every value arrives as text, such as CSV"""
+    TYPE_CONVERTERS = {**ObservationValidator.TYPE_CONVERTERS,
+                       db.REAL: convert_number_text,
+                       db.Integer: convert_number_text}
+
+text_observation_validator = TextObservationValidator(Observation)
+
+def iter_csv_rows(stream, read_size=None):
+    """Reads a CSV upload as a stream. Returns the Observation column for each
+    header and an iterator of (line number, values) for the data rows.
+    Raises ValueError for an empty upload or a header that does not map onto
+    the Observation columns."""
+    read_size = read_size or app.config['STREAM_READ_SIZE']
+    text = io.TextIOWrapper(io.BufferedReader(stream, read_size), encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("CSV upload has no header row")
+    names = [CSV_HEADER_NAMES.get(column.strip().lower()) for column in header]
+    unknown = [column for column, name in zip(header, names) if name is None]
+    if unknown:
+        raise ValueError(f"Unknown CSV columns: {', '.join(unknown)}")
+    if len(set(names)) != len(names):
+        raise ValueError("CSV header names a column more than once")
+    missing = [name for name in text_observation_validator.field_names if name not in names]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    def rows():
+        # line_num is the physical line, so rows with quoted newlines are reported where they end
+        for values in reader:
+            if any(values):
+                yield reader.line_num, values
+    return names, rows()
+
+def csv_record(names):
+    """Returns a function building a record from the values of one CSV row;
+    blank values are left out so they are reported as missing"""
+    def build(values):
+        if len(values) != len(names):
+            raise ValueError(f"expected {len(names)} values, found {len(values)}")
+        return {name: value for name, value in zip(names, values) if value != ''}
+    return build
+
+def stream_observations_csv(statement, fields=None):
+    """Yields a CSV document (header first) of the rows selected by `statement`
+    (an observation_select()), writing a partition of rows at a time"""
+    names = fields or OBSERVATION_FIELDS
+    table = Observation.__table__
+    time_positions = [position for position, name in enumerate(names) if isinstance(table.c[name].type, db.Time)]
+
+    def formatted(row):
+        row = list(row[:len(names)])
+        for position in time_positions:
+            row[position] = iso_time(row[position])
+        return row
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(names)
+    result = db.session.execute(statement, execution_options={"yield_per": app.config['STREAM_FETCH_SIZE']})
+    for partition in result.partitions():
+        writer.writerows(map(formatted, partition))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+#--------------------------------------------------------------------------------
+# Keyset pagination
+
+def encode_cursor(values):
+    """Opaque cursor holding the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Returns the sort key stored in a cursor, or None when no cursor was given"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+def parse_limit():
+    """Reads ?limit=, defaulting to OBSERVATIONS_PAGE_SIZE and capped at OBSERVATIONS_MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', app.config['OBSERVATIONS_PAGE_SIZE'])
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit should be an integer")
+    if not 1 <= limit <= app.config['OBSERVATIONS_MAX_PAGE_SIZE']:
+        raise ValueError(f"limit should be between 1 and {app.config['OBSERVATIONS_MAX_PAGE_SIZE']}")
+    return limit
+
+def keyset_page(statement, after, limit, sort=('observation_id', False)):
+    """Returns (rows, next_cursor) for the page following `after`.
+    Seeks on the (sort column, primary key) index rather than using OFFSET, so
+    every page costs the same however deep into the table it is. `statement`
+    must select the sort key columns."""
+    name, descending = sort
+    keys = sort_keys(name)
+    statement = statement.order_by(*sort_order(name, descending))
+    if after:
+        if after[0] != sort_spec(sort) or len(after) != len(keys) + 1:
+            raise ValueError("Cursor does not match the sort order")
+        try:
+            values = [cursor_value(key, value) for key, value in zip(keys, after[1:])]
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        position = tuple_(*keys)
+        statement = statement.where(position < tuple_(*values) if descending else position > tuple_(*values))
+    rows = db.session.execute(statement.limit(limit + 1)).all()
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor([sort_spec(sort)] + [json_value(getattr(last, key.name)) for key in keys])
+    return rows, None
+
+def stream_observations_json(statement, encode=None):
+    """Yields a JSON array of the rows selected by `statement` chunk by chunk.
+    Rows come from a server-side cursor (yield_per), so neither the rows nor the
+    serialised document are ever held in memory as a whole."""
+    encode = encode or row_encoder()
+    result = db.session.execute(statement, execution_options={"yield_per": app.config['STREAM_FETCH_SIZE']})
+    yield b'['
+    separator = b''
+    for partition in result.partitions():
+        body = encode_json(encode(partition))[1:-1]
+        if body:
+            yield separator + body
+            separator = b','
+    yield b']'
+
+def stream_observations_sequence(statement, encode, codec):
+    """Binary counterpart of stream_observations_json: yields the selected rows
+    as a sequence of MessagePack values or a CBOR sequence, a partition at a time"""
+    pack = codec.packer()
+    result = db.session.execute(statement, execution_options={"yield_per": app.config['STREAM_FETCH_SIZE']})
+    for partition in result.partitions():
+        yield b''.join(map(pack, encode(partition)))
+
 #--------------------------------------------------------------------------------
 @app.get("/login")
 def login():
@@ -148,71 +2623,31 @@ def login():
 @app.post("/observations/add_observations_json")
 def observations_add_json():
     """endpoint uses json to add observation details to db"""
-    json_data = request.get_json()  # req.get_json() used to access json sent
-    print(json_data)  # used for debugging purposes
-
-    # Validate the fields in the incoming JSON data
-    observation_date = json_data.get('observation_date')
-    observation_time = json_data.get('observation_time')
-    observation_timeZone = json_data.get('observation_timeZone')
-    observation_coordinates = json_data.get('observation_coordinates')
-    observation_waterTemp = json_data.get('observation_waterTemp')
-    observation_airTemp = json_data.get('observation_airTemp')
-    observation_humidity = json_data.get('observation_humidity')
-    observation_windSpeed = json_data.get('observation_windSpeed')
-    observation_windDirection = json_data.get('observation_windDirection')
-    observation_precipitation = json_data.get('observation_precipitation')
-    observation_haze = json_data.get('observation_haze')
-    observation_becquerel = json_data.get('observation_becquerel')
-
-    # Parse and validate date and time
-    try:
-        observation_date = datetime.strptime(observation_date, '%Y-%m-%d').date()
-        observation_time = datetime.strptime(observation_time, '%H:%M:%S').time()
-    except ValueError:
-        return {"message": "Invalid date or time format"}, 400
-
-    # Validate other fields
-    if not (validate_timezone_offset(observation_timeZone) and
-            validate_coordinates(observation_coordinates) and
-            validate_temperature(observation_waterTemp) and
-            validate_temperature(observation_airTemp) and
-            validate_humidity(observation_humidity) and
-            validate_wind_speed(observation_windSpeed) and
-            validate_wind_direction(observation_windDirection) and
-            validate_precipitation(observation_precipitation) and
-            validate_haze(observation_haze) and
-            validate_becquerel(observation_becquerel)):
-        return {"message": "Invalid data format"}, 400
+    json_data = request_data()  # JSON, MessagePack or CBOR depending on Content-Type
+
+    # Validate and convert every field in a single pass
+    row, field_errors = observation_validator.validate(json_data)
+    if field_errors:
+        return {"message": describe_validation_errors(field_errors), "errors": field_errors}, 400
 
     # Generate UUID if not provided
-    observation_id = str(uuid.uuid4())
+    row["observation_id"] = str(uuid.uuid4())
+
+    # Share one commit with concurrent requests when group commit is enabled
+    if app.config['GROUP_COMMIT_ENABLED']:
+        group_commit_buffer.submit(row)
+        # read back so the response shows the values as stored, like the path below
+        return dump_observations(db.session.get(Observation, row["observation_id"]), many=False)
 
     # Create new observation object
-    new_observation = Observation(
-        observation_id=observation_id,
-        observation_date=observation_date,
-        observation_time=observation_time,
-        observation_timeZone=observation_timeZone,
-        observation_coordinates=observation_coordinates,
-        observation_waterTemp=observation_waterTemp,
-        observation_airTemp=observation_airTemp,
-        observation_humidity=observation_humidity,
-        observation_windSpeed=observation_windSpeed,
-        observation_windDirection=observation_windDirection,
-        observation_precipitation=observation_precipitation,
-        observation_haze=observation_haze,
-        observation_becquerel=observation_becquerel
-    )
+    new_observation = Observation(**row)
 
     # Add and commit to the database
     db.session.add(new_observation)
 
     db.session.commit()
 
-    print("Record added:")
-    print(json.dumps(json_data, indent=4))  # used for debugging purposes
-    return observation_schema.jsonify(new_observation)
+    return dump_observations(new_observation, many=False)
 #--------------------------------------------------------------------------------  
 # adds multiple observations 
 @app.post("/observations/add_bulk_observations_json")
@@ -220,113 +2655,431 @@ def add_bulk_observations():
     """
     Endpoint to add multiple observations in bulk
     """
-    # Parse the JSON data from the request
-    json_data = request.get_json()
+    # Large uploads can be spooled and applied in the background with ?async=true
+    if query_flag('async'):
+        return accept_ingest_job()
+
+    # Parse the JSON (or MessagePack / CBOR) data from the request
+    json_data = request_data()
 
     # Ensure the input is a list (bulk data should be an array of objects)
     if not isinstance(json_data, list):
         return {"message": "Input should be a list of observations"}, 400
 
-    added_observations = []  # List to store successfully added observations
-    errors = []  # List to store errors for invalid records
+    # Validate every record into plain column mappings, column-wise for large batches
+    if use_columnar_validation(json_data):
+        _, added_rows, errors = validate_records_columnar(json_data)
+    else:
+        _, added_rows, errors = validate_records(json_data)
 
-    # Iterate through each observation in the input list
-    for index, record in enumerate(json_data):
+    for row in added_rows:
+        row["observation_id"] = str(uuid.uuid4())  # Generate a unique ID
+
+    # Write all valid observations with chunked set-based inserts and commit once
+    insert_observation_rows(added_rows)
+    db.session.commit()
+
+    # Return the results: added observations as stored (e.g. REAL columns as
+    # floats, wind direction as text) and any errors
+    added, _ = fetch_observations_by_ids([row["observation_id"] for row in added_rows], codec=response_codec())
+    return {
+        "added": added,
+        "errors": errors
+    }
+#--------------------------------------------------------------------------------
+# adds observations streamed as NDJSON (or a JSON array) in bounded chunks
+@app.post("/observations/add_observations_stream")
+def add_observations_stream():
+    """
+    Endpoint to ingest observations incrementally from the request stream.
+    Records are validated as they arrive and committed every
+    BULK_INSERT_CHUNK_SIZE rows; errors and progress are streamed back as NDJSON
+    (or a MessagePack / CBOR sequence when the client accepts one).
+    CSV uploads report errors by line number instead of record index.
+    """
+    content_type = request.mimetype
+    validator = None
+    position = "index"
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        records = iter_ndjson_lines(request.stream)
+        parse = app.json.loads
+    elif content_type in CSV_MEDIA_TYPES:
         try:
-            # Parse and validate date and time fields
-            observation_date = datetime.strptime(record.get('observation_date'), '%Y-%m-%d').date()
-            observation_time = datetime.strptime(record.get('observation_time'), '%H:%M:%S').time()
-
-            # Extract and validate other fields
-            observation_timeZone = record.get('observation_timeZone')
-            observation_coordinates = record.get('observation_coordinates')
-            observation_waterTemp = record.get('observation_waterTemp')
-            observation_airTemp = record.get('observation_airTemp')
-            observation_humidity = record.get('observation_humidity')
-            observation_windSpeed = record.get('observation_windSpeed')
-            observation_windDirection = record.get('observation_windDirection')
-            observation_precipitation = record.get('observation_precipitation')
-            observation_haze = record.get('observation_haze')
-            observation_becquerel = record.get('observation_becquerel')
-
-            # Validate all extracted fields
-            if not (validate_timezone_offset(observation_timeZone) and
-                    validate_coordinates(observation_coordinates) and
-                    validate_temperature(observation_waterTemp) and
-                    validate_temperature(observation_airTemp) and
-                    validate_humidity(observation_humidity) and
-                    validate_wind_speed(observation_windSpeed) and
-                    validate_wind_direction(observation_windDirection) and
-                    validate_precipitation(observation_precipitation) and
-                    validate_haze(observation_haze) and
-                    validate_becquerel(observation_becquerel)):
-                raise ValueError("Invalid data format")
-
-            # Create a new Observation object
-            new_observation = Observation(
-                observation_id=str(uuid.uuid4()),  # Generate a unique ID
-                observation_date=observation_date,
-                observation_time=observation_time,
-                observation_timeZone=observation_timeZone,
-                observation_coordinates=observation_coordinates,
-                observation_waterTemp=observation_waterTemp,
-                observation_airTemp=observation_airTemp,
-                observation_humidity=observation_humidity,
-                observation_windSpeed=observation_windSpeed,
-                observation_windDirection=observation_windDirection,
-                observation_precipitation=observation_precipitation,
-                observation_haze=observation_haze,
-                observation_becquerel=observation_becquerel
-            )
-
-            # Add the new observation to the session
-            db.session.add(new_observation)
-            added_observations.append(new_observation)  # Append to the success list
+            names, records = iter_csv_rows(request.stream)
+        except (ValueError, csv.Error) as e:
+            return {"message": str(e)}, 400
+        parse = csv_record(names)
+        validator = text_observation_validator
+        position = "line"
+    elif content_type == 'application/json':
+        records = iter_json_array(request.stream)
+        parse = lambda record: record
+    elif request_codec() is not None:
+        # MessagePack values or CBOR items one after another, one per record
+        records = request_codec().iter_sequence(request.stream)
+        parse = lambda record: record
+    else:
+        accepted = ['application/x-ndjson', 'application/json', 'text/csv'] + list(BINARY_CODECS)
+        return {"message": f"Content-Type should be one of {', '.join(accepted)}"}, 415
 
-        except Exception as e:
-            # Record errors for invalid data
-            errors.append({"index": index, "error": str(e)})
+    codec = response_codec()
+    if codec is not None:
+        emit, mimetype = codec.packer(), codec.sequence_mimetype
+    else:
+        emit, mimetype = lambda item: app.json.dumps(item) + "\n", 'application/x-ndjson'
+
+    chunk_size = app.config['BULK_INSERT_CHUNK_SIZE']
+
+    def generate():
+        rows = []  # validated rows waiting for the next chunk commit
+        added = 0
+        error_count = 0
+        try:
+            for index, item in records:
+                try:
+                    rows.append(build_observation_row(parse(item), validator))
+                except Exception as e:
+                    # Record errors for invalid data
+                    error_count += 1
+                    yield emit(bulk_error(index, e, position))
+
+                if len(rows) >= chunk_size:
+                    insert_observation_rows(rows)
+                    db.session.commit()
+                    added += len(rows)
+                    rows = []
+                    yield emit({"committed": added})
+        except (ValueError, csv.Error, HTTPException) as e:
+            # The stream itself is malformed (or fails to inflate); keep what was committed so far
+            error_count += 1
+            yield emit({"error": e.description if isinstance(e, HTTPException) else str(e)})
+
+        if rows:
+            insert_observation_rows(rows)
+            db.session.commit()
+            added += len(rows)
+
+        yield emit({"added": added, "errors": error_count})
 
-    # Commit all valid observations to the database
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+#--------------------------------------------------------------------------------
+def accept_ingest_job():
+    """Spools the request body to disk unparsed and queues it as an ingest job"""
+    job = IngestJob()
+    db.session.add(job)
+    db.session.flush()  # assigns the job id
+
+    os.makedirs(app.config['INGEST_SPOOL_DIR'], exist_ok=True)
+    codec = request_codec()
+    try:
+        with open(spool_path(job.job_id), 'wb') as spool:
+            if codec is not None:
+                # Jobs replay their spool as a JSON array, so binary bodies are
+                # converted here, one element at a time
+                spool.write(b'[')
+                for index, record in codec.iter_array(request.stream):
+                    if index:
+                        spool.write(b',')
+                    spool.write(app.json.dumps(record).encode())
+                spool.write(b']')
+            else:
+                shutil.copyfileobj(request.stream, spool, app.config['STREAM_READ_SIZE'])
+    except (ValueError, TypeError) as e:
+        # undecodable input, or values JSON cannot hold (e.g. unknown ext types or tags)
+        os.remove(spool_path(job.job_id))
+        db.session.rollback()
+        return {"message": f"Failed to decode {codec.mimetype} body: {e}" if codec else str(e)}, 400
+    except Exception:
+        # e.g. a compressed body that fails to inflate; no job is left behind
+        os.remove(spool_path(job.job_id))
+        raise
     db.session.commit()
 
-    # Return the results: added observations and any errors
+    submit_ingest_job_async(job.job_id)
+    status_url = f"/observations/jobs/{job.job_id}"
+    return {"job_id": job.job_id, "status": job.status, "status_url": status_url}, 202, {"Location": status_url}
+#--------------------------------------------------------------------------------
+# endpoint to report the progress of an asynchronous ingest job
+@app.get("/observations/jobs/<job_id>")
+@token_required
+def get_ingest_job(job_id):
+    job = db.session.get(IngestJob, job_id)
+    if job is None:
+        return {"message": f"Job {job_id} not found"}, 404
     return {
-        "added": observations_schema.dump(added_observations),
-        "errors": errors
+        "job_id": job.job_id,
+        "status": job.status,
+        "processed": job.processed,
+        "added": job.added,
+        "errors": json.loads(job.errors), # at most INGEST_JOB_MAX_ERRORS of them
+        "error_count": job.processed - job.added,
+        "message": job.message,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat()
     }
 #--------------------------------------------------------------------------------
-# endpoint to show all observations
+# endpoint to retry a failed ingest job from where it stopped
+@app.post("/observations/jobs/<job_id>/retry")
+@token_required
+def retry_ingest_job(job_id):
+    job = db.session.get(IngestJob, job_id)
+    if job is None:
+        return {"message": f"Job {job_id} not found"}, 404
+    if job.status != 'failed' or not os.path.exists(spool_path(job_id)):
+        return {"message": f"Job {job_id} is {job.status} and cannot be retried"}, 409
+    # records before job.processed are committed already and are skipped
+    job.status = 'queued'
+    job.message = None
+    db.session.commit()
+
+    submit_ingest_job_async(job_id)
+    status_url = f"/observations/jobs/{job_id}"
+    return {"job_id": job_id, "status": job.status, "status_url": status_url}, 202, {"Location": status_url}
+#--------------------------------------------------------------------------------
+# endpoint to expose write path metrics
+@app.get("/observations/metrics")
+@token_required
+def get_metrics():
+    return {"group_commit": group_commit_buffer.metrics(),
+            "request_compression": request_compression_metrics.metrics(),
+            "response_compression_cache": compressed_body_cache.metrics()}
+#--------------------------------------------------------------------------------
+# endpoint to show observations a page at a time (?all=true returns every row)
 @app.get("/observations/get_observations")
 @token_required
 def get_observations():
-    all_observations = Observation.query.all()
-    return observations_schema.jsonify(all_observations)
+    # Filters and sort order are translated into SQL WHERE / ORDER BY clauses,
+    # ?fields= narrows both the SELECT and the serializer
+    try:
+        conditions = parse_observation_filters(request.args)
+        sort = parse_sort(request.args)
+        fields = parse_fields(request.args)
+        dictionary = parse_columnar(request.args, fields)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    # Reads select Core rows and serialize them with the generated row encoder,
+    # or column by column with ?format=columnar
+    statement = observation_select(fields).where(*conditions)
+    codec = response_codec()
+    encode = row_encoder(fields, codec)
+    if dictionary is not None:
+        encode = partial(columnar_encoder(fields, codec), dictionary=dictionary)
+
+    # Full dumps can be streamed from a server-side cursor with ?stream=true
+    if query_flag('stream'):
+        if dictionary is not None:
+            return {"message": "format=columnar cannot be streamed, page through it or use all=true"}, 400
+        statement = statement.order_by(*sort_order(*sort))
+        if codec is not None:
+            return Response(stream_with_context(stream_observations_sequence(statement, encode, codec)),
+                            mimetype=codec.sequence_mimetype)
+        return Response(stream_with_context(stream_observations_json(statement, encode)), mimetype='application/json')
+
+    # The whole table in one response is only returned when explicitly asked for
+    if query_flag('all'):
+        rows = db.session.execute(statement.order_by(*sort_order(*sort))).all()
+        if codec is not None:
+            return Response(codec.dumps(encode(rows)), mimetype=codec.mimetype)
+        return Response(encode_json(encode(rows)), mimetype='application/json')
+
+    try:
+        limit = parse_limit()
+        after = decode_cursor(request.args.get('after'))
+        # the sort key is selected even when not projected, the next cursor is built from it
+        statement = observation_select(fields, *(key.name for key in sort_keys(sort[0]))).where(*conditions)
+        rows, next_cursor = keyset_page(statement, after, limit, sort)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    return {"observations": encode(rows), "next": next_cursor}
+#--------------------------------------------------------------------------------
+# endpoint to get the observations inside a bounding box through the R*Tree index
+@app.get("/observations/bbox")
+@token_required
+def get_observations_in_bbox():
+    """
+    Observations inside ?bbox=south,west,north,east, combined with any of the
+    get_observations filters and with the same sorting, paging and formats.
+    """
+    if request.args.get('bbox') is None:
+        return {"message": "bbox=south,west,north,east is required"}, 400
+    return get_observations()
+#--------------------------------------------------------------------------------
+# endpoint to count observations per geohash cell
+@app.get("/observations/geohash_grid")
+@token_required
+def get_geohash_grid():
+    """
+    Observation counts per geohash cell of ?precision= characters (default 4,
+    or the stored precision if lower), with each cell's bounds. Accepts the
+    get_observations filters.
+    """
+    try:
+        precision = int(request.args.get('precision', min(4, app.config['GEOHASH_PRECISION'])))
+        if not 1 <= precision <= app.config['GEOHASH_PRECISION']:
+            raise ValueError
+    except ValueError:
+        return {"message": f"precision should be between 1 and {app.config['GEOHASH_PRECISION']}"}, 400
+    try:
+        conditions = parse_observation_filters(request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    # One index-only scan of the geohash index; SQLite still sorts the prefixes
+    # in a temporary B-tree for the GROUP BY
+    cell = db.func.substr(Observation.__table__.c.observation_geohash, 1, precision)
+    statement = (select(cell, db.func.count()).where(Observation.__table__.c.observation_geohash.is_not(None), *conditions)
+                 .group_by(cell).order_by(cell))
+    cells = []
+    for geohash, count in db.session.execute(statement):
+        south, west, north, east = geohash_bounds(geohash)
+        cells.append({"geohash": geohash, "count": count, "bbox": [south, west, north, east]})
+    return {"cells": cells, "precision": precision}
+#--------------------------------------------------------------------------------
+# endpoint to get the observations nearest a point, or within a radius of it
+@app.get("/observations/nearby")
+@token_required
+def get_nearby_observations():
+    """
+    The ?k= observations nearest ?lat=&lon= (within ?radius_km= when given),
+    nearest first, each with its great-circle distance_km. Accepts the
+    get_observations filters, e.g. observed_from for the last 24 hours.
+    """
+    try:
+        lat, lon, k, radius_km = parse_nearby(request.args)
+        conditions = parse_observation_filters(request.args)
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    rowids, distances, searched = find_nearby(conditions, lat, lon, k, radius_km)
+    rows = fetch_observations_by_rowids(rowids, fields)
+    observations = row_encoder(fields, response_codec())(rows)
+    distance_of = dict(zip(rowids, distances))
+    for observation, row in zip(observations, rows):
+        observation["distance_km"] = distance_of[row[-1]]
+    return {"observations": observations, "radius_km": searched}
 #--------------------------------------------------------------------------------
 # endpoint uses route parameters to determine observation to be queried from db
 @app.get("/observations/get_one_observation/<observation_id>")
 @token_required
 def get_one_observation(observation_id):
-    observation = Observation.query.filter_by(observation_id=observation_id).first()
-    return observation_schema.jsonify(observation)
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+    observation = Observation.query.options(*projection(fields)).filter_by(observation_id=observation_id).first()
+    return dump_observations(observation, fields, many=False)
 #--------------------------------------------------------------------------------
 #endpoint uses query parameters to get observation
 @app.get("/observations/get_one_observation")
 @token_required
 def get_one_observation_query():
     observation_id = request.args.get("observation_id")
-    observation = Observation.query.filter_by(observation_id=observation_id).first()
-    return observation_schema.jsonify(observation)
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+    observation = Observation.query.options(*projection(fields)).filter_by(observation_id=observation_id).first()
+    return dump_observations(observation, fields, many=False)
 #--------------------------------------------------------------------------------
 # endpoint used to get observation by json
 @app.get("/observations/get_one_observation_json")
 @token_required
 def get_one_observation_json():
-     json_data = request.get_json() # used to access json data
-     print(json_data) # used for debugging
+     json_data = request_data() # used to access json (or MessagePack / CBOR) data
      observation_id = json_data["observation_id"]
-     observation = Observation.query.filter_by(observation_id=observation_id).first()
-     return observation_schema.jsonify(observation)
+     try:
+          fields = parse_fields(request.args)
+     except ValueError as e:
+          return {"message": str(e)}, 400
+     observation = Observation.query.options(*projection(fields)).filter_by(observation_id=observation_id).first()
+     return dump_observations(observation, fields, many=False)
+#--------------------------------------------------------------------------------
+# endpoint used to get many observations at once by a json list of ids
+@app.post("/observations/get_observations_by_ids")
+@token_required
+def get_observations_by_ids():
+    json_data = request_data(silent=True)
+    observation_ids = json_data.get("observation_ids") if isinstance(json_data, dict) else None
+    if not isinstance(observation_ids, list) or not all(isinstance(i, str) for i in observation_ids):
+        return {"message": "Expected a JSON object with an observation_ids list of strings"}, 400
+    if len(observation_ids) > app.config['ID_LOOKUP_MAX_IDS']:
+        return {"message": f"At most {app.config['ID_LOOKUP_MAX_IDS']} ids can be requested at once"}, 400
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    observations, missing = fetch_observations_by_ids(observation_ids, fields, codec=response_codec())
+    return {"observations": observations, "missing": missing}
+#--------------------------------------------------------------------------------
+# endpoint to export observations as an Arrow IPC stream, a Parquet file or CSV
+@app.get("/observations/export")
+@token_required
+def export_observations():
+    file_format = request.args.get('format', 'arrow')
+    if file_format not in ('csv', *ARROW_MEDIA_TYPES):
+        return {"message": f"format should be one of {', '.join(ARROW_MEDIA_TYPES)}, csv"}, 400
+    if file_format != 'csv' and pa is None:
+        return {"message": "Arrow / Parquet export requires pyarrow"}, 501
+    try:
+        conditions = parse_observation_filters(request.args)
+        sort = parse_sort(request.args)
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+    statement = observation_select(fields).where(*conditions).order_by(*sort_order(*sort))
+    if file_format == 'csv':
+        body, mimetype = stream_observations_csv(statement, fields), 'text/csv'
+    else:
+        schema = observation_arrow_schema(fields)
+        body, mimetype = stream_observations_arrow(statement, schema, file_format), ARROW_MEDIA_TYPES[file_format]
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=observations.{file_format}"})
+#--------------------------------------------------------------------------------
+# endpoint to import observations from an Arrow IPC stream or a Parquet file
+@app.post("/observations/import")
+def import_observations():
+    """
+    Endpoint to bulk load an Arrow / Parquet upload batch by batch through the
+    set-based insert path. observation_id values in the file are kept.
+    """
+    if pa is None:
+        return {"message": "Arrow / Parquet import requires pyarrow"}, 501
+    try:
+        file_format = parse_arrow_format(request.args.get('format', request.mimetype))
+    except ValueError as e:
+        return {"message": str(e)}, 415
+
+    schema = observation_arrow_schema()
+    added = 0
+    errors = []
+    start = 0
+    try:
+        for batch in iter_arrow_batches(request.stream, file_format):
+            records = arrow_batch_records(batch, schema)
+            validate = validate_records_columnar if use_columnar_validation(records) else validate_records
+            mask, rows, batch_errors = validate(records, stored_observation_validator)
+            for error in batch_errors:
+                error["index"] += start
+            errors += batch_errors
+            for row, record in zip(rows, compress(records, mask)):
+                row["observation_id"] = record.get("observation_id") or str(uuid.uuid4())
+            insert_observation_rows(rows)
+            added += len(rows)
+            start += len(records)
+    except (ValueError, pa.ArrowException) as e:
+        db.session.rollback()
+        return {"message": f"Invalid {file_format} upload: {e}"}, 400
+    except IntegrityError:
+        db.session.rollback()
+        return {"message": "Upload contains observation_id values that already exist"}, 409
+    db.session.commit()
+
+    return {"added": added, "errors": errors}
 #--------------------------------------------------------------------------------
 # endpoint used to update multiple observations by json
 @app.put("/observations/update_bulk_observations")
@@ -334,8 +3087,8 @@ def update_bulk_observations():
     """
     Endpoint to update multiple observations in bulk
     """
-    # Parse the JSON data from the request
-    json_data = request.get_json()
+    # Parse the JSON (or MessagePack / CBOR) data from the request
+    json_data = request_data()
 
     # Ensure the input is a list (bulk data should be an array of objects)
     if not isinstance(json_data, list):
@@ -355,24 +3108,27 @@ def update_bulk_observations():
             if not observation:
                 raise ValueError(f"Observation ID {observation_id} not found")
 
-            # Update fields only if they are provided in the input
-            for key, value in record.items():
-                if hasattr(observation, key):
-                    setattr(observation, key, value)
+            # Validate and convert only the fields provided in the input
+            changes, field_errors = observation_validator.validate(record, partial=True)
+            if field_errors:
+                raise ObservationValidationError(field_errors)
+
+            for key, value in changes.items():
+                setattr(observation, key, value)
 
             # Add the updated observation to the success list
             updated_observations.append(observation)
 
         except Exception as e:
             # Record errors for invalid data
-            errors.append({"index": index, "error": str(e)})
+            errors.append(bulk_error(index, e))
 
     # Commit all changes to the database
     db.session.commit()
 
     # Return the results: updated observations and any errors
     return {
-        "updated": observations_schema.dump(updated_observations),
+        "updated": dump_observations(updated_observations),
         "errors": errors
     }
 #-------------------------------------------------------------------------------
@@ -391,8 +3147,8 @@ def delete_bulk_observations():
     """
     Endpoint to delete multiple observations in bulk
     """
-    # Parse the JSON data from the request
-    json_data = request.get_json()
+    # Parse the JSON (or MessagePack / CBOR) data from the request
+    json_data = request_data()
 
     # Ensure the input is a list (bulk data should be an array of observation IDs)
     if not isinstance(json_data, list):
@@ -432,4 +3188,11 @@ def delete_bulk_observations():
 if __name__ == '__main__':
      with app.app_context():
           db.create_all()
+          ensure_observation_columns()
+          # before indexing, so new indexes are built once over filled columns
+          backfill_observation_positions()
+          backfill_observation_geohashes()
+          backfill_observation_timestamps()
+          ensure_observation_indexes()
+          ensure_spatial_index()
      app.run(debug=True)
\ No newline at end of file